@@ -0,0 +1,200 @@
+import time
+from array import array
+from sqlalchemy import Column, Integer, String, Float, JSON, select, delete
+from sqlalchemy.dialects.sqlite import insert
+from catalog import catalog
+from db import Base, Session
+
+# Battles
+#
+# Opponents are the catalog's read-only stat lines, shared by every battle.
+# A Battle only owns what changes while fighting: each opponent's hp and shield, kept in two int arrays.
+
+class Battle:
+    __slots__ = ("type", "opponents", "hp", "shield", "current", "last_attack", "resume", "resume_text", "updated_at")
+
+    def __init__(self, battle_type, opponents, hp=None, shield=None, current=0, last_attack=None, resume=None, resume_text="", updated_at=None):
+        self.type = battle_type
+        self.opponents = tuple(opponents)
+        self.hp = array('i', hp if hp is not None else [o.health for o in self.opponents])
+        self.shield = array('i', shield if shield is not None else [o.shield for o in self.opponents])
+        self.current = current
+        self.last_attack = last_attack
+        # Ambushes keep the battle they interrupted here and hand it back once the ambusher falls
+        self.resume = resume
+        self.resume_text = resume_text
+        # When the store last saved it, the reaper uses this to find abandoned battles
+        self.updated_at = updated_at
+
+    def finished(self):
+        return self.current >= len(self.opponents)
+
+# Battle sessions
+#
+# One row per player that is in the middle of a battle (siege, raid, fortify, assassination or ambush).
+# Every read is served from `cache`; every change is written through to the backend so battles survive a restart.
+# The backend is the table below unless the bot runs on shared state (state.py), where commands sync the
+# player's battle from Redis first so any process can pick up any player's next /attack.
+
+class BattleSession(Base):
+    __tablename__ = 'battles'
+    slack_id = Column(String, primary_key=True)
+    battle_type = Column(String, nullable=False)
+    opponents = Column(JSON, nullable=False)
+    current = Column(Integer, default=0)
+    last_attack = Column(Float, nullable=True)
+    resume = Column(JSON, nullable=True)
+    updated_at = Column(Float, nullable=False)
+
+class SQLBattles:
+    # The default backend, the battles table in the bot's own database. Only this process writes it,
+    # so the store's cache is always current and there's nothing to sync.
+    shared = False
+
+    async def load(self):
+        async with Session() as session:
+            rows = (await session.scalars(select(BattleSession))).all()
+        return {row.slack_id: _from_row(row) for row in rows}
+
+    async def fetch(self, slack_id):
+        async with Session() as session:
+            row = await session.get(BattleSession, slack_id)
+        return _from_row(row) if row is not None else None
+
+    async def save(self, slack_id, battle):
+        values = to_values(slack_id, battle)
+        stmt = insert(BattleSession).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[BattleSession.slack_id],
+            set_={k: v for k, v in values.items() if k != "slack_id"},
+        )
+        async with Session() as session, session.begin():
+            await session.execute(stmt)
+
+    async def delete(self, slack_id):
+        async with Session() as session, session.begin():
+            await session.execute(delete(BattleSession).where(BattleSession.slack_id == slack_id))
+
+    async def reap(self, cache, ttl, now, keep=()):
+        idle = [
+            slack_id for slack_id, battle in cache.items()
+            if now - (battle.updated_at or now) > ttl and slack_id not in keep
+        ]
+        if not idle:
+            return {}
+        reaped = {slack_id: cache[slack_id] for slack_id in idle}
+        async with Session() as session, session.begin():
+            await session.execute(delete(BattleSession).where(BattleSession.slack_id.in_(idle)))
+        return reaped
+
+class BattleStore:
+
+    def __init__(self, backend=None):
+        self.cache = {}
+        self.backend = backend or SQLBattles()
+
+    async def load(self):
+        self.cache = await self.backend.load()
+        return len(self.cache)
+
+    async def sync(self, slack_id):
+        # With a backend other processes write to, re-reads the player's battle before a command uses it
+        if not self.backend.shared:
+            return
+        battle = await self.backend.fetch(slack_id)
+        if battle is None:
+            self.cache.pop(slack_id, None)
+        else:
+            self.cache[slack_id] = battle
+
+    def get(self, slack_id):
+        return self.cache.get(slack_id)
+
+    def __contains__(self, slack_id):
+        return slack_id in self.cache
+
+    def __len__(self):
+        return len(self.cache)
+
+    async def start(self, slack_id, battle_type, names, last_attack=None, resume=None, resume_text=""):
+        table = catalog.opponents[battle_type]
+        battle = Battle(battle_type, [table[name] for name in names], last_attack=last_attack, resume=resume, resume_text=resume_text)
+        await self.put(slack_id, battle)
+        return battle
+
+    async def put(self, slack_id, battle):
+        battle.updated_at = time.time()
+        self.cache[slack_id] = battle
+        await self.backend.save(slack_id, battle)
+
+    async def pop(self, slack_id):
+        battle = self.cache.pop(slack_id, None)
+        if battle is not None:
+            await self.backend.delete(slack_id)
+        return battle
+
+    async def reap(self, ttl, now=None, keep=()):
+        # Drops every battle nobody has touched for `ttl` seconds, except the players in `keep`,
+        # and returns them so the caller can settle them
+        now = now if now is not None else time.time()
+        reaped = await self.backend.reap(self.cache, ttl, now, keep)
+        for slack_id in reaped:
+            self.cache.pop(slack_id, None)
+        return reaped
+
+# Rows store opponents as [name, hp, shield] and rebuild the shared Opponent from the battle type's table
+
+def _dump_opponents(battle):
+    return [[o.name, hp, shield] for o, hp, shield in zip(battle.opponents, battle.hp, battle.shield)]
+
+def _load_battle(battle_type, opponents, current, last_attack=None, resume=None, resume_text="", updated_at=None):
+    table = catalog.opponents[battle_type]
+    # Rows written before opponents were compacted hold one dict per opponent
+    opponents = [[o["name"], o["hp"], o["shield"]] if isinstance(o, dict) else o for o in opponents]
+    return Battle(
+        battle_type,
+        [table[name] for name, _, _ in opponents],
+        hp=[hp for _, hp, _ in opponents],
+        shield=[shield for _, _, shield in opponents],
+        current=current,
+        last_attack=last_attack,
+        resume=resume,
+        resume_text=resume_text,
+        updated_at=updated_at,
+    )
+
+def to_values(slack_id, battle):
+    resume = None
+    if battle.resume is not None:
+        resume = {
+            "battle_type": battle.resume.type,
+            "opponents": _dump_opponents(battle.resume),
+            "current": battle.resume.current,
+            "stage_text": battle.resume_text,
+        }
+    return {
+        "slack_id": slack_id,
+        "battle_type": battle.type,
+        "opponents": _dump_opponents(battle),
+        "current": battle.current,
+        "last_attack": battle.last_attack,
+        "resume": resume,
+        "updated_at": battle.updated_at,
+    }
+
+def _from_row(row):
+    return from_values({column: getattr(row, column) for column in ("battle_type", "opponents", "current", "last_attack", "resume", "updated_at")})
+
+def from_values(values):
+    # The inverse of to_values, for any backend that stores the same fields
+    resume = None
+    resume_text = ""
+    if values.get("resume"):
+        resume = _load_battle(values["resume"]["battle_type"], values["resume"]["opponents"], values["resume"].get("current", 0))
+        resume_text = values["resume"].get("stage_text", "")
+    return _load_battle(
+        values["battle_type"], values["opponents"], values.get("current", 0),
+        values.get("last_attack"), resume, resume_text, values.get("updated_at"),
+    )
+
+battles = BattleStore()
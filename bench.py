@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+
+# Command benchmark
+#
+# Runs the slash-command handlers in-process against a throwaway SQLite database, no Slack needed.
+# Every synthetic player starts each mission, fights it out with /attack and /use, then checks /satchel, /rank
+# and /leaderboard. The game clock is simulated (5 seconds between commands) and the reply pacing is off,
+# so the numbers are the bot's own work.
+#
+#   python bench.py                      compare against bench_baseline.json, exit 1 on a regression
+#   python bench.py --update-baseline    store this run as the new baseline
+
+BASELINE_PATH = Path(__file__).with_name("bench_baseline.json")
+
+# Commands are this many game-seconds apart, inside /attack's 3-15 second window
+STEP = 5
+
+# Swings before a battle that's still going is abandoned with /exit
+MAX_SWINGS = 60
+
+# Latency and throughput may drift this far from the baseline before it counts as a regression.
+# On top of that every timing gets TIME_SLACK_MS, sub-millisecond commands swing by more than 50% between runs
+# and machines. Statements per command are deterministic for a given seed, so they only get a small allowance.
+TIME_TOLERANCE = 0.5
+TIME_SLACK_MS = 1.0
+STATEMENT_TOLERANCE = 0.05
+
+# The database and settings have to be in place before bot.py (and db.py) are imported
+_workdir = tempfile.mkdtemp(prefix="warlord-bench-")
+os.environ.setdefault("BOT_TOKEN", "xoxb-bench")
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{_workdir}/bench.db"
+os.environ["JOURNAL_URL"] = f"sqlite+aiosqlite:///{_workdir}/bench-journal.db"
+os.environ["DB_ECHO"] = "0"
+os.environ["METRICS_PORT"] = "0"
+os.environ.pop("COOLDOWN_DMS", None)
+
+import bot
+from db import engine
+from sqlalchemy import event
+
+_command = ContextVar("bench_command", default=None)
+
+class Clock:
+
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds=STEP):
+        self.now += seconds
+
+class Recorder:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statements = defaultdict(int)
+        self.responses = defaultdict(int)
+        event.listen(engine.sync_engine, "before_cursor_execute", self.count)
+
+    def count(self, conn, cursor, statement, parameters, context, executemany):
+        # Statements from background tasks (stat flushes, cooldown expiry) land under None
+        self.statements[_command.get()] += 1
+
+    async def call(self, name, handler, slack_id, text=""):
+        replies = []
+
+        async def ack(*args, **kwargs):
+            pass
+
+        async def respond(message="", **kwargs):
+            replies.append(message)
+
+        token = _command.set(name)
+        start = time.perf_counter()
+        try:
+            await handler(ack, respond, {"user_id": slack_id, "text": text})
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+            self.responses[name] += len(replies)
+            _command.reset(token)
+        return replies
+
+    def report(self):
+        results = {}
+        for name, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            total = sum(samples)
+            results[name] = {
+                "calls": len(samples),
+                "ops_per_sec": round(len(samples) / total, 1) if total else 0.0,
+                "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+                "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+                "statements_per_op": round(self.statements[name] / len(samples), 2),
+                "responses_per_op": round(self.responses[name] / len(samples), 2),
+            }
+        return results
+
+def _percentile(samples, pct):
+    # Nearest-rank on already sorted samples
+    index = max(0, min(len(samples) - 1, round(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+MISSIONS = (
+    ("siege", bot.siege),
+    ("raid", bot.raid),
+    ("fortify", bot.fortify),
+    ("assassinate", bot.assassinate),
+)
+
+async def play(recorder, clock, slack_id):
+    for name, handler in MISSIONS:
+        clock.tick()
+        await recorder.call(name, handler, slack_id)
+
+        for swing in range(MAX_SWINGS):
+            if bot.battles.get(slack_id) is None:
+                break
+            clock.tick()
+            await recorder.call("attack", bot.attack, slack_id, "Rusty Sword")
+            if swing % 5 == 4 and bot.battles.get(slack_id) is not None:
+                clock.tick()
+                await recorder.call("use", bot.use, slack_id, "Small Health Potion")
+
+        if bot.battles.get(slack_id) is not None:
+            clock.tick()
+            await recorder.call("exit", bot.exit, slack_id)
+
+    for name, handler, text in (("satchel", bot.satchel, ""), ("rank", bot.rank, ""), ("leaderboard", bot.leaderboard, ""), ("leaderboard", bot.leaderboard, "kills 2")):
+        clock.tick()
+        await recorder.call(name, handler, slack_id, text)
+
+async def run(users, concurrency, seed):
+    random.seed(seed)
+    clock = Clock()
+    time.time = clock
+    bot.PACING = 0
+
+    await bot.startup()
+    recorder = Recorder()
+    try:
+        slack_ids = [f"UBENCH{i:06d}" for i in range(users)]
+        start = time.perf_counter()
+        for i in range(0, users, concurrency):
+            await asyncio.gather(*(play(recorder, clock, slack_id) for slack_id in slack_ids[i:i + concurrency]))
+        elapsed = time.perf_counter() - start
+    finally:
+        await bot.shutdown()
+
+    commands = recorder.report()
+    calls = sum(result["calls"] for result in commands.values())
+    return {
+        "users": users,
+        "concurrency": concurrency,
+        "seed": seed,
+        "elapsed_s": round(elapsed, 2),
+        "ops_per_sec": round(calls / elapsed, 1),
+        "background_statements": recorder.statements[None],
+        "commands": commands,
+    }
+
+def _slower(now_ms, base_ms, tolerance, slack_ms):
+    return now_ms > base_ms * (1 + tolerance) + slack_ms
+
+def compare(result, baseline, time_tolerance=TIME_TOLERANCE, time_slack_ms=TIME_SLACK_MS):
+    regressions = []
+    if (baseline.get("users"), baseline.get("seed")) != (result["users"], result["seed"]):
+        print(f"Note: baseline was recorded with users={baseline.get('users')} seed={baseline.get('seed')}, comparing anyway")
+
+    for name, base in baseline["commands"].items():
+        now = result["commands"].get(name)
+        if now is None:
+            regressions.append(f"{name}: not run")
+            continue
+        if now["statements_per_op"] > base["statements_per_op"] * (1 + STATEMENT_TOLERANCE) + 0.01:
+            regressions.append(f"{name}: {now['statements_per_op']} statements/op, baseline {base['statements_per_op']}")
+        if "responses_per_op" in base and now["responses_per_op"] > base["responses_per_op"] + 0.01:
+            regressions.append(f"{name}: {now['responses_per_op']} responses/op, baseline {base['responses_per_op']}")
+        if _slower(now["p99_ms"], base["p99_ms"], time_tolerance, time_slack_ms):
+            regressions.append(f"{name}: p99 {now['p99_ms']}ms, baseline {base['p99_ms']}ms")
+        # Throughput is compared as milliseconds per command so it gets the same slack
+        if _slower(1000 / now["ops_per_sec"], 1000 / base["ops_per_sec"], time_tolerance, time_slack_ms):
+            regressions.append(f"{name}: {now['ops_per_sec']} ops/s, baseline {base['ops_per_sec']}")
+    return regressions
+
+def print_result(result):
+    print(f"{result['users']} players, {result['elapsed_s']}s, {result['ops_per_sec']} commands/s overall, "
+          f"{result['background_statements']} background statements")
+    print(f"{'command':<14}{'calls':>8}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'stmts/op':>10}{'posts/op':>10}")
+    for name, r in result["commands"].items():
+        print(f"{name:<14}{r['calls']:>8}{r['ops_per_sec']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['statements_per_op']:>10}{r['responses_per_op']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the slash-command handlers against a temporary database.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=1, help="players playing at the same time")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=TIME_TOLERANCE, help="allowed latency/throughput drift, 0.5 is 50%%")
+    parser.add_argument("--slack", type=float, default=TIME_SLACK_MS, help="milliseconds allowed on every timing on top of --tolerance")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.users, args.concurrency, args.seed))
+    print_result(result)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --update-baseline to store one")
+        return 0
+
+    regressions = compare(result, json.loads(args.baseline.read_text()), args.tolerance, args.slack)
+    if regressions:
+        print("Regressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("No regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
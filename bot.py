@@ -1,292 +1,107 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-from sqlalchemy import create_engine, Column, Integer, String, JSON
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.mutable import MutableDict
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from db import engine, per_request, create_tables, check_settings
+from writebehind import stat_buffer
+from battles import battles
+from catalog import catalog
+from loot import loot
+from progression import progression
+from cooldowns import cooldowns
+from reaper import reaper
+from profiles import profiles
+from users import users
+from state import state
+from locks import user_locks
+from journal import journal
+from inventory import inventory
+import replies
+from outbound import outbound
+from profiler import profiler
+from metrics import metrics_server, registry, instrument, timed, watch_engine, StateCollector
+from leaderboard import leaderboards, parse_stat, STATS, PAGE_SIZE
+import asyncio
+import math
 import random
+import signal
 import time
-from slack_sdk import WebClient
-import copy
 
 # Initialization
 
 env_path = Path('.') / '.env'
 load_dotenv(dotenv_path=env_path)
 
-app = App(token=os.environ["BOT_TOKEN"],)
-client = WebClient(token=os.environ["BOT_TOKEN"])
-
-engine = create_engine("sqlite:///warlord.db", echo=True)
-Session = sessionmaker(bind=engine)
-session = Session()
-
-Base = declarative_base()
-
-# DB Models
-
-class User(Base):
-    __tablename__ = 'users'
-    id = Column(Integer, primary_key=True)
-    slack_id = Column(String, unique=True)
-    health = Column(Integer, default=100)
-    shield = Column(Integer, default=0)
-    rank = Column(String,default='Recruit')
-    inventory = Column(MutableDict.as_mutable(JSON),  default=lambda: {"Rusty Sword": 1, "Small Health Potion": 3, "Rusty Armor": 1, "Family Picture": 1})
-    xp = Column(Integer, default=0)
-    kills = Column(Integer, default=0)
-    sieges = Column(Integer, default=0)
-    raids = Column(Integer, default=0)
-    fortifications = Column(Integer, default=0)
-    assassinations = Column(Integer, default=0)
-
-Base.metadata.create_all(engine)
-
-Items = {
-    "Shield": {"unique": True}, 
-    "Small Health Potion": {"unique": False},
-    "Medium Health Potion": {"unique": False},
-    "Big Health Potion": {"unique": False},
-    "Rusty Sword": {"unique": True, "damage": 10},
-    "Steel Blade": {"unique": True, "damage": 20},
-    "Battle Blade": {"unique": True, "damage": 40},
-    "Knight's Sword": {"unique": True, "damage": 50},   
-    "Champion's Sword": {"unique": True, "damage": 75},
-    "Legendary Sword": {"unique": True, "damage": 85},
-    "Needlessly Large Sword": {"unique": True, "damage": 100},
-    "Banana": {"unique": False},
-    "Family Picture": {"unique": True},
-    "Admin Sword": {"unique": True, "damage": 200}
-}
-
-Weapons = {
-    "Rusty Sword": {"unique": True, "damage": 10},
-    "Steel Blade": {"unique": True, "damage": 20},
-    "Battle Blade": {"unique": True, "damage": 40},
-    "Knight's Sword": {"unique": True, "damage": 50},   
-    "Champion's Sword": {"unique": True, "damage": 75},
-    "Legendary Sword": {"unique": True, "damage": 85},
-    "Needlessly Large Sword": {"unique": True, "damage": 100},
-    "Admin Sword": {"unique": True, "damage": 200}
-}
-
-Healable = {
-    "Small Health Potion": {"unique": False, "heal": 25},
-    "Medium Health Potion": {"unique": False, "heal": 50},
-    "Big Health Potion": {"unique": False, "heal": 100},
-}
-
-Armor = {
-    "Rusty Armor": {"unique": False, "shield": 25},
-    "Chainmail Armor": {"unique": False, "shield": 50},
-    "Legendary Armor": {"unique": False, "shield": 100}
-}
-
-random_items = {
-
-}
-
-Opponents = {
-
-    # Very Low Tier
-
-    "Peasant": {"health": 20, "shield": 0, "level": 'very low', "damage": 10},
-    "Militia": {"health": 15, "shield": 0, "level": 'very low', "damage": 5},
-    "Bandit": {"health": 15, "shield": 0, "level": 'very low', "damage": 7},
-    "Thief": {"health": 15, "shield": 2, "level": 'very low', "damage": 10},
-    "Squire": {"health": 20, "shield": 3, "level": 'very low', "damage": 12},
-
-    # Low Tier
-
-    "Footman": {"health": 30, "shield": 0, "level": 'low', "damage": 20},
-    "Spearman": {"health": 35,"shield": 5, "level": 'low', "damage": 16},
-    "Scout": {"health": 25, "shield": 5, "level": 'low', "damage": 17},
-    "Skirmisher": {"health": 30, "shield": 0, "level": 'low', "damage": 22},
-    "Rookie": {"health": 25, "shield": 5, "level": 'low', "damage": 25},
-
-    # Middle Tier
-
-    "Vanguard": {"health": 40, "shield": 10, "level": 'mid', "damage": 30},
-    "Berserker": {"health": 50, "shield": 5, "level": 'mid', "damage": 25},
-    "Duelist": {"health": 45, "shield": 10, "level": 'mid', "damage": 35},
-    "Executioner": {"health": 55, "shield": 15, "level": 'mid', "damage": 35},
-    "Shieldbearer": {"health": 50, "shield": 10, "level": 'mid', "damage": 40},
-
-    # High Tier
-
-    "Captain": {"health": 75, "shield": 70, "level": 'high', "damage": 75},
-    "Champion": {"health": 80, "shield": 50, "level": 'high', "damage": 70},
-    "Knight-Commander": {"health": 90, "shield": 75, "level": 'high', "damage": 70},
-    "Warmaster": {"health": 100, "shield": 20, "level": 'high', "damage": 80},
-    "Castellan": {"health": 85, "shield": 40, "level": 'high', "damage": 70},
-
-    # Very High Tier
-
-    "High Marshal": {"health": 100, "shield": 85, "level": 'very high', "damage": 90},
-    "Lord Protector": {"health": 100, "shield": 100, "level": 'very high', "damage": 85},
-    "Grandmaster": {"health": 100, "shield": 95, "level": 'very high', "damage": 95},
-    "Conqueror": {"health": 100, "shield": 100, "level": 'very high', "damage": 100},
-    "The Harbinger": {"health": 100, "shield": 100, "level": 'very high', "damage": 100},
-}
-
-raid_Opponents = {
-
-    # Very Low Tier
+app = AsyncApp(token=os.environ["BOT_TOKEN"],)
+outbound.token = os.environ["BOT_TOKEN"]
 
-    "Timid Villager": {"health": 20, "shield": 0, "level": 'very low', "damage": 10},
-    "Scared Farmhand": {"health": 15, "shield": 0, "level": 'very low', "damage": 7},
-    "Scrawny Herdsman": {"health": 15, "shield": 0, "level": 'very low', "damage": 5},
-    "Knife-Wielding Peasant": {"health": 20, "shield": 2, "level": 'very low', "damage": 10},
-    "Village Scavenger": {"health": 15, "shield": 1, "level": 'very low', "damage": 8},
+stat_buffer.listeners.append(leaderboards.observe)
+stat_buffer.listeners.append(profiles.observe)
+users.listeners.append(leaderboards.observe)
+inventory.listeners.append(profiles.forget)
 
-    # Low Tier
+watch_engine(engine)
+registry.register(StateCollector(battles, cooldowns, outbound))
 
-    "Village Guard": {"health": 30, "shield": 5, "level": 'low', "damage": 18},
-    "Torchbearer Villager": {"health": 28, "shield": 0, "level": 'low', "damage": 16},
-    "Village Scout": {"health": 25, "shield": 5, "level": 'low', "damage": 17},
-    "Brawler Villager": {"health": 30, "shield": 0, "level": 'low', "damage": 22},
-    "Young Hunter": {"health": 28, "shield": 3, "level": 'low', "damage": 20},
+def command(name):
+    def register(handler):
+        label = name.lstrip("/")
+        handler = replies.acked(user_locks.serialized(state.synced(per_request(handler))))
+        handler = replies.buffered(handler, timed(outbound.responder))
+        return app.command(name)(instrument(label, profiler.wrap(label, handler)))
+    return register
 
-    # Middle Tier
+# Slack user ids allowed to use the admin commands, comma separated
+ADMIN_IDS = {slack_id.strip() for slack_id in os.environ.get("ADMIN_IDS", "").split(",") if slack_id.strip()}
 
-    "Armored Villager": {"health": 40, "shield": 10, "level": 'mid', "damage": 30},
-    "Village Protector": {"health": 50, "shield": 5, "level": 'mid', "damage": 25},
-    "Blade Villager": {"health": 45, "shield": 10, "level": 'mid', "damage": 35},
-    "Hardened Guard": {"health": 55, "shield": 15, "level": 'mid', "damage": 35},
-    "Shield Villager": {"health": 50, "shield": 10, "level": 'mid', "damage": 40},
+# Seconds between your swing and the opponent's reply. At 0 (the default) a swing is answered in one message,
+# otherwise the opponent's turn is sent as a follow-up after the delay.
+PACING = float(os.environ.get("REPLY_PACING", 0))
 
-    # High Tier
+async def pause():
+    await replies.pause(PACING)
 
-    "Captain of the Guard": {"health": 75, "shield": 70, "level": 'high', "damage": 75},
-    "Elite Villager Fighter": {"health": 80, "shield": 50, "level": 'high', "damage": 70},
-    "Blade Commander Guard": {"health": 90, "shield": 75, "level": 'high', "damage": 70},
-    "Fierce Watcher Villager": {"health": 100, "shield": 20, "level": 'high', "damage": 80},
-    "Iron Castellan Guard": {"health": 85, "shield": 40, "level": 'high', "damage": 70},
+def loot_roll(user, battle_type=None):
+    return loot.roll(progression.tier(user.rank), battle_type)
 
-    # Very High Tier
-
-    "Shadow Marshal Guard": {"health": 100, "shield": 85, "level": 'very high', "damage": 90},
-    "Protector of the Hall Villager": {"health": 100, "shield": 100, "level": 'very high', "damage": 85},
-    "Master Duelist Guard": {"health": 100, "shield": 95, "level": 'very high', "damage": 95},
-    "Silent Conqueror Villager": {"health": 100, "shield": 100, "level": 'very high', "damage": 100},
-    "Blood Harbinger Guard": {"health": 100, "shield": 100, "level": 'very high', "damage": 100},
-}
-
-Assasinations = {
-
-    # Very Low Tier
-
-    "Gorrik the Rusted": {"health": 50, "shield": 0, "level": 'very low', "damage": 25},
-    "Fenric Drunkenhand": {"health": 55, "shield": 0, "level": 'very low', "damage": 30},
-    "Syla the Fallen": {"health": 65, "shield": 0, "level": 'very low', "damage": 27},
-    "Tharn Crackedshield": {"health": 60, "shield": 2, "level": 'very low', "damage": 28},
-    "Dreg Campbane": {"health": 57, "shield": 3, "level": 'very low', "damage": 29},
-
-    # Low Tier
-
-    "Rowan Ironhelm": {"health": 70, "shield": 0, "level": 'low', "damage": 35},
-    "Varek of the Blades": {"health": 75,"shield": 5, "level": 'low', "damage": 40},
-    "Tilda of Ashridge": {"health": 80, "shield": 5, "level": 'low', "damage": 36},
-    "Garric Stormsword": {"health": 76, "shield": 0, "level": 'low', "damage": 39},
-    "Bailiff Korran": {"health": 78, "shield": 5, "level": 'low', "damage": 37},
-
-    # Middle Tier
-
-    "Drax Ironmantle": {"health": 100, "shield": 15, "level": 'mid', "damage": 45},
-    "Kael Freeblade": {"health": 100, "shield": 10, "level": 'mid', "damage": 50},
-    "Sergeant Veyric": {"health": 100, "shield": 12, "level": 'mid', "damage": 55},
-    "Captain Malor": {"health": 100, "shield": 13, "level": 'mid', "damage": 54},
-    "Thorne Borderwarden": {"health": 100, "shield": 14, "level": 'mid', "damage": 49},
-
-    # High Tier
+async def rank_up(user, respond):
+    # Only a rank that actually changed is written, and only a promotion is announced
+    change = progression.advance(user)
+    if change is None:
+        return
+    stat_buffer.stage(user)
+    if not change.promoted:
+        return
 
-    "Draven Bloodhelm": {"health": 100, "shield": 70, "level": 'high', "damage": 75},
-    "Serik Bannerbane": {"health": 100, "shield": 65, "level": 'high', "damage": 70},
-    "Malakar the Prelate": {"health": 100, "shield": 75, "level": 'high', "damage": 70},
-    "Kaelen Crimsonheir": {"health": 100, "shield": 60, "level": 'high', "damage": 80},
-    "Vaylen Keepwarden": {"health": 100, "shield":  70, "level": 'high', "damage": 70},
+    if progression.top(change.new):
+        await respond(f""" You Have Ranked Up...
 
-    # Very High Tier
+The Warlord has been watching your battles, He called you to talk.
+You go talk to him and to your surprise, He has decided you are now the {change.new}, The Warlord's Right Hand Man.""")
+    else:
+        await respond(f""" You Have Ranked Up...
 
-    "Kaerok the Warlord": {"health": 100, "shield": 100, "level": 'very high', "damage": 120},
-    "Sorrin Mercurial": {"health": 100, "shield": 100, "level": 'very high', "damage": 115},
-    "Eldrith Spellbinder": {"health": 100, "shield": 100, "level": 'very high', "damage": 125},
-    "Councilor Varath": {"health": 100, "shield": 100, "level": 'very high', "damage": 110},
-    "Guildmaster Kaivor": {"health": 100, "shield": 100, "level": 'very high', "damage": 105},
-}
+The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
+You Are Now a {change.new}""")
 
-def loot_roll(user):
-
-    Ranks = {
-        "Recruit": "very low",
-        "Footman": "very low",
-        "Soldier": "low",
-        "Raider": "low",
-        "Veteran": "mid",
-        "Champion": "mid",
-        "Knight": "high",
-        "Commander": "high",
-        "General": "very high",
-        "Conqueror": "very high",
-        }
-    
-    rank_tier = Ranks.get(user.rank, "very low")
-    loot_pool = []
-
-    if rank_tier in ["very low", "low"]:
-        loot_pool += ["Rusty Sword"] * 5 + ["Steel Blade"] * 2 + ["Banana"]
-    elif rank_tier in ["mid"]:
-        loot_pool += ["Steel Blade"] * 3 + ["Battle Blade"] * 2 + ["Knight's Sword"]
-    elif rank_tier  in ["high"]:
-        loot_pool += ["Battle Blade"] * 2 + ["Knight's Sword"] * 2 + ["Champion's Sword"]
-    elif rank_tier  in ["very high"]:
-        loot_pool += ["Champion's Sword", "Legendary Sword", "Needlessly Large Sword"] * 2
-
-    if rank_tier in ["very low", "low"]:
-        loot_pool += ["Rusty Armor"] * 5
-    elif rank_tier in ["mid"]:
-        loot_pool += ["Chainmail Armor"] * 3
-    elif rank_tier in ["high"]:
-        loot_pool += ["Chainmail Armor"] * 2 + ["Legendary Armor"]
-    elif rank_tier in ["very high"]:
-        loot_pool += ["Legendary Armor"] * 3
-
-
-    if rank_tier in ["very low", "low"]:
-        loot_pool += ["Small Health Potion"] * 5
-    elif rank_tier in ["mid"]:
-        loot_pool += ["Small Health Potion"] * 2 + ["Medium Health Potion"] * 3
-    elif rank_tier in ["high"]:
-        loot_pool += ["Medium Health Potion"] * 3 + ["Big Health Potion"] * 2
-    elif rank_tier in ["very high"]:
-        loot_pool += ["Big Health Potion"] * 4 + ["Medium Health Potion"] * 2
-
-    return random.choice(loot_pool)
-
-def add_item(user, item_name):
-    item_def = Items.get(item_name, {"unique": False})
-
-    if user.inventory is None:
-        user.inventory = {}
-
-    if item_def["unique"]:
-        if item_name in user.inventory:
-            return False
-        user.inventory[item_name] = 1
-    else:
-        user.inventory[item_name] = user.inventory.get(item_name, 0) + 1
+async def profile(slack_user_id):
+    # Read-only snapshot for commands that only show stats, first-time players are created here
+    user = await profiles.get(slack_user_id)
+    if not user:
+        await users.get(slack_user_id)
+        user = await profiles.get(slack_user_id)
+    return user
 
-    return True
+async def add_item(user, item_name):
+    return await inventory.add(user, item_name)
 
 # Events/Commands
 
-@app.command('/wl-help')
-def help(ack, respond, command):
-    ack()
-    respond("""> *All Available Commands:*
+@command('/wl-help')
+async def help(ack, respond, command):
+    await ack()
+    await respond("""> *All Available Commands:*
 >
 > */satchel* → View the items you currently carry.
 > */rank (user)* → Check your rank and XP, or mention a user to see theirs.
@@ -301,22 +116,19 @@ def help(ack, respond, command):
 > */raid-count (user)* → Shows how many raids you've taken part in, or mention a user to see theirs.
 > */fortify-count (user)* → Shows how many times you've defended the castle, or mention a user to see theirs.
 > */assassination-count (user)* → Shows how many times you've assassinated a target, or mention a user to see theirs.
-> */leaderboard* → Shows The Leaderboard.
+> */leaderboard (stat) (page)* → Shows The Leaderboard, by XP or by kills, sieges, raids, fortifications or assassinations.
+> */stats (user)* → Shows your rank, XP, health and every battle count at once, or mention a user to see theirs.
 """)
 
-@app.command('/satchel')
-def satchel(ack, respond, command):
-    ack()
+@command('/satchel')
+async def satchel(ack, respond, command):
+    await ack()
     slack_user_id = command['user_id']
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
+    user = await profile(slack_user_id)
 
     if not user.inventory:
-        respond("Your Satchel is empty.")
+        await respond("Your Satchel is empty.")
     else:
         items = []
         for name, qty in user.inventory.items():
@@ -324,11 +136,11 @@ def satchel(ack, respond, command):
                 items.append(f"*{name} (x{qty})*")
             else:
                 items.append(f"*{name}*")
-        respond("Your Satchel contains: \n\n" + "\n".join(items))
+        await respond("Your Satchel contains: \n\n" + "\n".join(items))
 
-@app.command('/rank')
-def rank(ack, respond, command):
-    ack()
+@command('/rank')
+async def rank(ack, respond, command):
+    await ack()
 
     text = (command.get("text") or "").strip()
 
@@ -339,16 +151,15 @@ def rank(ack, respond, command):
         slack_user_id = command['user_id']
         is_self = True
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
+    user = await profile(slack_user_id)
     
+    position, players = await leaderboards.position("xp", user)
+    top = max(1, math.ceil(position / players * 100))
+
     if is_self:
-        respond(f"Your Current Rank Is: {user.rank} And {user.xp} XP")
+        await respond(f"Your Current Rank Is: {user.rank} And {user.xp} XP\nYou Are #{position} of {players} Warriors (Top {top}%)")
     else:
-        respond(f"<{slack_user_id}>'s Current Rank Is: {user.rank} And {user.xp} XP")
+        await respond(f"<{slack_user_id}>'s Current Rank Is: {user.rank} And {user.xp} XP\nThey Are #{position} of {players} Warriors (Top {top}%)")
 
 
 siege_stages = [
@@ -532,171 +343,134 @@ assassinate_stages = [
 *The Warlord Rewards You For Your Troubles...*"""
 ]
 
-@app.command('/use')
-def use(ack, respond, command):
-    ack()
+battle_stages = {
+    "siege": siege_stages,
+    "raid": raid_stages,
+    "fortify": fortify_stages,
+    "assassination": assassinate_stages,
+    "ambush": [],
+}
+
+ambushed_text = "You're Being Ambushed, Use */attack* To Fight Your Way Out."
+
+@command('/use')
+async def use(ack, respond, command):
+    await ack()
 
     text = (command.get("text") or "").strip()
     item_name = text.title()
     slack_user_id = command['user_id']
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-
-    if slack_user_id in active_siege:
-        container = active_siege
-        stages = siege_stages
-        battle_type = "siege"
-
-    elif slack_user_id in active_raid:
-        container = active_raid     
-        stages = raid_stages
-        battle_type = "raid"
+    user = await users.get(slack_user_id)
 
-    elif slack_user_id in active_fortify:
-        container = active_fortify
-        stages = fortify_stages
-        battle_type = "fortify"
-
-    else:
-        respond("You're Not In The Middle of Any Battle Right Now.")
+    battle = battles.get(slack_user_id)
+    if not battle or battle.type not in ("siege", "raid", "fortify"):
+        await respond("You're Not In The Middle of Any Battle Right Now.")
         return
 
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
-
-    else:
+    if not await inventory.has(user, item_name):
+        await respond(f"You Don't Have a *{item_name}* In Your Satchel, Use /satchel To Check Your Items.")
+        return
+    
+    healable = catalog.healable.get(item_name)
+    armor = catalog.armor.get(item_name)
 
-        if item_name not in user.inventory:
-            respond(f"You Don't Have a *{item_name}* In Your Satchel, Use /satchel To Check Your Items.")
-            return
-        
-        healable = Healable.get(item_name)
-        armor = Armor.get(item_name)
+    if not healable and not armor:
+        await respond(f"*{text}* Is Not a Usable Item.")
+        return
 
+    if await inventory.take(user, item_name):
         if healable:
-            user.health = min(user.health + healable['heal'], 100)
-
-        elif armor:
-            user.shield = min(user.shield + armor['shield'], 100)
-
+            user.health = min(user.health + healable.heal, 100)
         else:
-            respond(f"*{text}* Is Not a Usable Item.")
-            return
-
-        if user.inventory.get(item_name, 0) > 0:
-            user.inventory[item_name] -= 1
-            if user.inventory[item_name] == 0:
-                del user.inventory[item_name]
+            user.shield = min(user.shield + armor.shield, 100)
 
-            session.commit()
-            respond(f"""You Have Used a {item_name}
-                    
+        stat_buffer.stage(user)
+        await respond(f"""You Have Used a {item_name}
+                
 You Now have: 
 {user.health} HP | {user.shield} Shield""")
 
-active_raid = {}
-raid_cds = {}
-raid_cd_seconds = 3 * 60 * 60
+def wait_time(seconds):
+    remaining_seconds = int(seconds)
+    remaininghrs = remaining_seconds // 3600
+    remainingmins = (remaining_seconds % 3600) // 60
+    if remaininghrs > 0:
+        return f"*{remaininghrs}h {remainingmins}m.*"
+    return f"*{remainingmins}m.*"
+
+ready_text = {
+    "siege": "Your Army Has Rested. You Can Lead Another Siege With */siege*.",
+    "raid": "Your Army Has Rested. You Can Raid Another Village With */raid*.",
+    "fortify": "Your Defenders Have Rested. You Can Defend The Castle Again With */fortify*.",
+    "assassination": "The Warlord Has Another Target For You. Use */assassinate* When You're Ready.",
+}
 
-active_fortify = {}
-fortify_cds = {}
-fortify_cd_seconds = 24 * 60 * 60
+async def cooldown_ready(slack_id, kind):
+    outbound.post_message(slack_id, ready_text[kind])
 
-active_assassination = {}
-assassinate_cds = {}
-assassinate_cd_seconds = 1 * 60 * 60
+forfeit_text = {
+    "siege": "*You Left Your Army Waiting Too Long, The Siege Is Lost... The Warlord Counts It As a Forfeit.*",
+    "raid": "*You Left Your Army Waiting Too Long, The Raid Is Called Off... The Warlord Counts It As a Forfeit.*",
+    "fortify": "*You Left The Castle Gates Unguarded Too Long... The Warlord Counts It As a Forfeit.*",
+    "assassination": "*Your Target Slipped Away While You Waited... The Warlord Counts It As a Forfeit.*",
+    "ambush": "*You Never Fought Back Against Your Ambushers... The Warlord Counts It As a Forfeit.*",
+}
 
-active_siege = {}
-cds = {}
-siege_cd_seconds = 12 * 60 * 60
-last_attack = {}
+async def battle_forfeited(slack_id, battle):
+    journal.record(slack_id, "forfeit", battle.type)
+    outbound.post_message(slack_id, forfeit_text[battle.type])
 
-@app.command('/siege')
-def siege(ack, respond, command):
-    ack()
+@command('/siege')
+async def siege(ack, respond, command):
+    await ack()
 
     slack_user_id = command['user_id']
     now = time.time()
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id) 
-        session.add(user)
-        session.commit()  
+    user = await users.get(slack_user_id)
 
-    if slack_user_id in active_siege:
-        respond("You're Already In a Siege. Use *'/attack'* To Continue Fighting!")
+    busy = {
+        "siege": "You're Already In a Siege. Use *'/attack'* To Continue Fighting!",
+        "raid": "You're Still In The Midst of a Raid, Finish It Before Starting a Siege.",
+        "fortify": "You're Still In The Midst of Defending Your Castle, Use */attack* To Fight.",
+        "assassination": "You're Already In An Assassination.",
+        "ambush": ambushed_text,
+    }
+    battle = battles.get(slack_user_id)
 
-    elif slack_user_id in active_raid:
-        respond("You're Still In The Midst of a Raid, Finish It Before Starting a Siege.")
+    cooldown = cooldowns.remaining(slack_user_id, "siege")
 
-    elif slack_user_id in active_fortify:
-        respond("You're Still In The Midst of Defending Your Castle, Use */attack* To Fight.")
-    
-    elif slack_user_id in active_assassination:
-        respond("You're Already In An Assassination.")
-
-    elif slack_user_id in cds:
-        elapsed = now - cds[slack_user_id]
-        if elapsed < siege_cd_seconds:
-            remaining_seconds = int(siege_cd_seconds - elapsed)
-            remaininghrs = remaining_seconds // 3600
-            remainingmins = (remaining_seconds % 3600) // 60
-            if remaininghrs > 0:
-                respond(f"You Must Rest Before Doing Another Siege. Please Wait *{remaininghrs}h {remainingmins}m.*")
-            else:
-                respond(f"You Must Rest Before Doing Another Siege. Please Wait *{remainingmins}m.*")
+    if battle:
+        await respond(busy[battle.type])
 
-    else:
+    elif cooldown:
+        await respond(f"You Must Rest Before Doing Another Siege. Please Wait {wait_time(cooldown)}")
 
-        Ranks = {
-        "Recruit": "very low",
-        "Footman": "very low",
-        "Soldier": "low",
-        "Raider": "low",
-        "Veteran": "mid",
-        "Champion": "mid",
-        "Knight": "high",
-        "Commander": "high",
-        "General": "very high",
-        "Conqueror": "very high",
-        }
+    else:
 
-        rank = Ranks.get(user.rank, "very low")
+        rank = progression.tier(user.rank)
 
-        randomopp = [name for name, data in Opponents.items() if data["level"] == rank]
+        randomopp = catalog.tier_opponents("siege", rank)
 
         num_opponents = random.randint(3, 5)
         num_opponents = min(num_opponents, max(1, len(randomopp)))
 
         sampled_names = random.sample(randomopp, num_opponents)
 
-        opponents_list = [
-        {"name": name,
-        "hp": Opponents[name]["health"],
-        "shield": Opponents[name]["shield"],
-        "damage": Opponents[name]["damage"],
-        "level": Opponents[name]["level"]}
-        for name in sampled_names
-        ]
+        battle = await battles.start(slack_user_id, "siege", sampled_names)
+        journal.record(slack_user_id, "start", "siege", opponents=list(sampled_names))
 
-        active_siege[slack_user_id] = {
-        "opponents": opponents_list,
-        "current": 0
-        }
-
-        first_opponent = opponents_list[0]
+        first_opponent = battle.opponents[0]
 
         user.health = 100
         user.shield = user.shield
-        session.commit()
+        stat_buffer.stage(user)
+        await stat_buffer.flush(slack_user_id)
 
-        cds[slack_user_id] = now
-        last_attack.pop(slack_user_id, None)
+        await cooldowns.trigger(slack_user_id, "siege", now)
 
-        respond(f"""*You Have Started a Siege...*
+        await respond(f"""*You Have Started a Siege...*
 
 *The ground trembles beneath your march as your banners rise high against the dusk.*
 *Drums thunder. Torches blaze.*
@@ -710,99 +484,65 @@ def siege(ack, respond, command):
 
 *You Stand There, Holding Your Ground, As You Spot An Opponent, It's...*
            
-*{first_opponent['name']}*
+*{first_opponent.name}*
 
-{first_opponent['hp']} HP | {first_opponent['shield']} Shield | {first_opponent['damage']} Damage | {first_opponent['level'].title()} Tier
+{first_opponent.health} HP | {first_opponent.shield} Shield | {first_opponent.damage} Damage | {first_opponent.level.title()} Tier
 
 *Use /attack To FIGHT!*
 """)
 
 
 
-@app.command('/raid')
-def raid(ack, respond, command):
-    ack()
+@command('/raid')
+async def raid(ack, respond, command):
+    await ack()
 
     slack_user_id = command['user_id']
     now = time.time()
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id) 
-        session.add(user)
-        session.commit()  
+    user = await users.get(slack_user_id)
+
+    busy = {
+        "siege": "You're Still In The Midst of a Siege. Finish It Before Starting a Raid.",
+        "raid": "You're Already In a Raid. Use *'/attack'* To Continue Fighting!",
+        "fortify": "You're Still In The Midst of Defending Your Castle, Use */attack* To Fight.",
+        "assassination": "You're Already In An Assassination.",
+        "ambush": ambushed_text,
+    }
+    battle = battles.get(slack_user_id)
 
-    if slack_user_id in active_siege:
-        respond("You're Still In The Midst of a Siege. Finish It Before Starting a Raid.")
+    cooldown = cooldowns.remaining(slack_user_id, "raid")
 
-    elif slack_user_id in active_raid:
-        respond("You're Already In a Raid. Use *'/attack'* To Continue Fighting!")
+    if battle:
+        await respond(busy[battle.type])
 
-    elif slack_user_id in active_fortify:
-        respond("You're Still In The Midst of Defending Your Castle, Use */attack* To Fight.")
-    
-    elif slack_user_id in active_assassination:
-        respond("You're Already In An Assassination.")
-
-    elif slack_user_id in raid_cds:
-        elapsed = now - raid_cds[slack_user_id]
-        if elapsed < raid_cd_seconds:
-            remaining_seconds = int(raid_cd_seconds - elapsed)
-            remaininghrs = remaining_seconds // 3600
-            remainingmins = (remaining_seconds % 3600) // 60
-            if remaininghrs > 0:
-                respond(f"You Must Rest Before Doing Another Raid. Please Wait *{remaininghrs}h {remainingmins}m.*")
-            else:
-                respond(f"You Must Rest Before Doing Another Raid. Please Wait *{remainingmins}m.*")
+    elif cooldown:
+        await respond(f"You Must Rest Before Doing Another Raid. Please Wait {wait_time(cooldown)}")
 
     else:
 
-        Ranks = {
-        "Recruit": "very low",
-        "Footman": "very low",
-        "Soldier": "low",
-        "Raider": "low",
-        "Veteran": "mid",
-        "Champion": "mid",
-        "Knight": "high",
-        "Commander": "high",
-        "General": "very high",
-        "Conqueror": "very high",
-        }
+        rank = progression.tier(user.rank)
 
-        rank = Ranks.get(user.rank, "very low")
-
-        randomopp = [name for name, data in raid_Opponents.items() if data["level"] == rank]
+        randomopp = catalog.tier_opponents("raid", rank)
 
         num_opponents = random.randint(1, 3)
         num_opponents = min(num_opponents, max(1, len(randomopp)))
 
         sampled_names = random.sample(randomopp, num_opponents)
 
-        opponents_list = [
-        {"name": name,
-        "hp": raid_Opponents[name]["health"],
-        "shield": raid_Opponents[name]["shield"],
-        "damage": raid_Opponents[name]["damage"],
-        "level": raid_Opponents[name]["level"]}
-        for name in sampled_names
-        ]
-
-        active_raid[slack_user_id] = {
-        "opponents": opponents_list,
-        "current": 0
-        }
+        battle = await battles.start(slack_user_id, "raid", sampled_names)
+        journal.record(slack_user_id, "start", "raid", opponents=list(sampled_names))
 
-        first_opponent = opponents_list[0]
+        first_opponent = battle.opponents[0]
 
         user.health = 100
         user.shield = user.shield
-        session.commit()
+        stat_buffer.stage(user)
+        await stat_buffer.flush(slack_user_id)
 
-        raid_cds[slack_user_id] = now
-        last_attack.pop(slack_user_id, None)
+        await cooldowns.trigger(slack_user_id, "raid", now)
 
-        respond(f"""*You Have Started a Raid...*
+        await respond(f"""*You Have Started a Raid...*
                 
 
 *You move silently through the village outskirts. Shadows cling to the walls, moonlight glinting off your weapons.*  
@@ -813,94 +553,60 @@ def raid(ack, respond, command):
 
 *Suddenly, a lone guard appears from the shadows, weapon raised and eyes wide. You hold your breath. It's...*
 
-*{first_opponent['name']}*
+*{first_opponent.name}*
 
-{first_opponent['hp']} HP | {first_opponent['shield']} Shield | {first_opponent['damage']} Damage | {first_opponent['level'].title()} Tier""")
+{first_opponent.health} HP | {first_opponent.shield} Shield | {first_opponent.damage} Damage | {first_opponent.level.title()} Tier""")
 
-@app.command('/fortify')
-def fortify(ack, respond, command):
-    ack()
+@command('/fortify')
+async def fortify(ack, respond, command):
+    await ack()
 
     slack_user_id = command['user_id']
     now = time.time()
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id) 
-        session.add(user)
-        session.commit()  
+    user = await users.get(slack_user_id)
 
-    if slack_user_id in active_siege:
-        respond("You're Still In The Midst of a Siege. Finish It Before Going Back To Defend Your Castle.")
+    busy = {
+        "siege": "You're Still In The Midst of a Siege. Finish It Before Going Back To Defend Your Castle.",
+        "raid": "You're Still In The Midst of a Raid. Finish It Before Going Back To Defend Your Castle.",
+        "fortify": "You're Already Defending Your Castle, Use */attack* To Fight.",
+        "assassination": "You're Already In An Assassination.",
+        "ambush": ambushed_text,
+    }
+    battle = battles.get(slack_user_id)
 
-    elif slack_user_id in active_raid:
-        respond("You're Still In The Midst of a Raid. Finish It Before Going Back To Defend Your Castle.")
-    
-    elif slack_user_id in active_fortify:
-        respond("You're Already Defending Your Castle, Use */attack* To Fight.")
-    
-    elif slack_user_id in active_assassination:
-        respond("You're Already In An Assassination.")
-
-    elif slack_user_id in fortify_cds:
-        elapsed = now - fortify_cds[slack_user_id]
-        if elapsed < fortify_cd_seconds:
-            remaining_seconds = int(fortify_cd_seconds - elapsed)
-            remaininghrs = remaining_seconds // 3600
-            remainingmins = (remaining_seconds % 3600) // 60
-            if remaininghrs > 0:
-                respond(f"You Must Rest Before Defending Your Castle. Please Wait *{remaininghrs}h {remainingmins}m.*")
-            else:
-                respond(f"You Must Rest Before Defending Your Castle. Please Wait *{remainingmins}m.*")
+    cooldown = cooldowns.remaining(slack_user_id, "fortify")
 
-    else:
+    if battle:
+        await respond(busy[battle.type])
 
-        Ranks = {
-        "Recruit": "very low",
-        "Footman": "very low",
-        "Soldier": "low",
-        "Raider": "low",
-        "Veteran": "mid",
-        "Champion": "mid",
-        "Knight": "high",
-        "Commander": "high",
-        "General": "very high",
-        "Conqueror": "very high",
-        }
+    elif cooldown:
+        await respond(f"You Must Rest Before Defending Your Castle. Please Wait {wait_time(cooldown)}")
 
-        rank = Ranks.get(user.rank, "very low")
+    else:
 
-        randomopp = [name for name, data in Opponents.items() if data["level"] == rank]
+        rank = progression.tier(user.rank)
+
+        randomopp = catalog.tier_opponents("fortify", rank)
 
         num_opponents = random.randint(5, 7)
         num_opponents = min(num_opponents, max(1, len(randomopp)))
 
         sampled_names = random.sample(randomopp, num_opponents)
 
-        opponents_list = [
-        {"name": name,
-        "hp": Opponents[name]["health"],
-        "shield": Opponents[name]["shield"],
-        "damage": Opponents[name]["damage"],
-        "level": Opponents[name]["level"]}
-        for name in sampled_names
-        ]
-
-        active_fortify[slack_user_id] = {
-        "opponents": opponents_list,
-        "current": 0
-        }
+        battle = await battles.start(slack_user_id, "fortify", sampled_names)
+        journal.record(slack_user_id, "start", "fortify", opponents=list(sampled_names))
 
-        first_opponent = opponents_list[0]
+        first_opponent = battle.opponents[0]
 
         user.health = 100
         user.shield = user.shield
-        session.commit()
+        stat_buffer.stage(user)
+        await stat_buffer.flush(slack_user_id)
 
-        fortify_cds[slack_user_id] = now
-        last_attack.pop(slack_user_id, None)
+        await cooldowns.trigger(slack_user_id, "fortify", now)
 
-        respond(f"""*You Have Started Defending Your Castle...*
+        await respond(f"""*You Have Started Defending Your Castle...*
 
 *The night presses in, shadows pooling around the battlements. Torches flicker, throwing the courtyard into sharp contrasts of light and darkness.*  
 
@@ -910,111 +616,73 @@ def fortify(ack, respond, command):
 
 *The alarm bell tolls sharply, cutting through the silence. Archers take their positions, hearts pounding. You hold your breath. The attackers are almost upon you. It's...*
 
-*{first_opponent['name']}*
+*{first_opponent.name}*
 
-{first_opponent['hp']} HP | {first_opponent['shield']} Shield | {first_opponent['damage']} Damage | {first_opponent['level'].title()} Tier""")
+{first_opponent.health} HP | {first_opponent.shield} Shield | {first_opponent.damage} Damage | {first_opponent.level.title()} Tier""")
 
-@app.command('/assassinate')
-def assassinate(ack, respond, command):
-    ack()
+@command('/assassinate')
+async def assassinate(ack, respond, command):
+    await ack()
 
     slack_user_id = command['user_id']
     now = time.time()
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id) 
-        session.add(user)
-        session.commit()  
+    user = await users.get(slack_user_id)
 
-    if slack_user_id in active_siege:
-        respond("You're Still In The Midst of a Siege. Finish It Before Going Back To Defend Your Castle.")
+    busy = {
+        "siege": "You're Still In The Midst of a Siege. Finish It Before Going Back To Defend Your Castle.",
+        "raid": "You're Still In The Midst of a Raid. Finish It Before Going Back To Defend Your Castle.",
+        "fortify": "You're Still In The Midst of Defending Your Castle, Use */attack* To Fight.",
+        "assassination": "You're Already In An Assassination.",
+        "ambush": ambushed_text,
+    }
+    battle = battles.get(slack_user_id)
 
-    elif slack_user_id in active_raid:
-        respond("You're Still In The Midst of a Raid. Finish It Before Going Back To Defend Your Castle.")
-    
-    elif slack_user_id in active_fortify:
-        respond("You're Still In The Midst of Defending Your Castle, Use */attack* To Fight.")
-
-    elif slack_user_id in active_assassination:
-        respond("You're Already In An Assassination.")
-
-    elif slack_user_id in assassinate_cds:
-        elapsed = now - assassinate_cds[slack_user_id]
-        if elapsed < assassinate_cd_seconds:
-            remaining_seconds = int(assassinate_cd_seconds - elapsed)
-            remaininghrs = remaining_seconds // 3600
-            remainingmins = (remaining_seconds % 3600) // 60
-            if remaininghrs > 0:
-                respond(f"You Must Rest Before Going On Another Assassination. Please Wait *{remaininghrs}h {remainingmins}m.*")
-            else:
-                respond(f"You Must Rest Before Going On Another Assassination. Please Wait *{remainingmins}m.*")
+    cooldown = cooldowns.remaining(slack_user_id, "assassination")
+
+    if battle:
+        await respond(busy[battle.type])
+
+    elif cooldown:
+        await respond(f"You Must Rest Before Going On Another Assassination. Please Wait {wait_time(cooldown)}")
         
     else:
 
-        Ranks = {
-        "Recruit": "very low",
-        "Footman": "very low",
-        "Soldier": "low",
-        "Raider": "low",
-        "Veteran": "mid",
-        "Champion": "mid",
-        "Knight": "high",
-        "Commander": "high",
-        "General": "very high",
-        "Conqueror": "very high",
-        }
+        rank = progression.tier(user.rank)
 
-        rank = Ranks.get(user.rank, "very low")
-
-        randomopp = [name for name, data in Assasinations.items() if data["level"] == rank]
+        randomopp = catalog.tier_opponents("assassination", rank)
 
         num_opponents = 1
 
         sampled_names = random.sample(randomopp, num_opponents)
 
-        opponents_list = [
-        {"name": name,
-        "hp": Assasinations[name]["health"],
-        "shield": Assasinations[name]["shield"],
-        "damage": Assasinations[name]["damage"],
-        "level": Assasinations[name]["level"]}
-        for name in sampled_names
-        ]
-
-        active_assassination[slack_user_id] = {
-        "opponents": opponents_list,
-        "current": 0
-        }
+        battle = await battles.start(slack_user_id, "assassination", sampled_names)
+        journal.record(slack_user_id, "start", "assassination", opponents=list(sampled_names))
 
-        first_opponent = opponents_list[0]
+        first_opponent = battle.opponents[0]
 
         user.health = 100
         user.shield = user.shield
-        session.commit()
+        stat_buffer.stage(user)
+        await stat_buffer.flush(slack_user_id)
 
-        assassinate_cds[slack_user_id] = now
-        last_attack.pop(slack_user_id, None)
+        await cooldowns.trigger(slack_user_id, "assassination", now)
 
-        respond(f"""*The Warlord Has Ordered You To Assasinate Someone...*
+        await respond(f"""*The Warlord Has Ordered You To Assasinate Someone...*
 
-*You hear The Warlord calling your name, You go to answer him, He orders you to go to assassinate someone, Their name is... {first_opponent['name']}*.  
+*You hear The Warlord calling your name, You go to answer him, He orders you to go to assassinate someone, Their name is... {first_opponent.name}*.  
 
 *You leave the castle to go to assassinate them, The air hangs heavy as you slip through alleys and torchlit halls.*
 *Your mark is near, The sound of steel on stone, The faint mutter of guards, The weight of coin that bought their loyalty.*
 *You tighten your grip as you spot the target. Tonight, Blood will be spilled.*
 
-*{first_opponent['name']}*
-
-{first_opponent['hp']} HP | {first_opponent['shield']} Shield | {first_opponent['damage']} Damage | {first_opponent['level'].title()} Tier""")
+*{first_opponent.name}*
 
-active_ambush = {}
+{first_opponent.health} HP | {first_opponent.shield} Shield | {first_opponent.damage} Damage | {first_opponent.level.title()} Tier""")
 
-
-@app.command('/attack')
-def attack(ack, respond, command):
-    ack()
-    global active_siege, active_raid, active_fortify, active_assassination, active_ambush, last_attack
+@command('/attack')
+async def attack(ack, respond, command):
+    await ack()
 
     min_time = 3
     max_time = 15
@@ -1025,126 +693,89 @@ def attack(ack, respond, command):
 
     slack_user_id = command['user_id']
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
-
-    Ranks = {
-    "Recruit": "very low",
-    "Footman": "very low",
-    "Soldier": "low",
-    "Raider": "low",
-    "Veteran": "mid",
-    "Champion": "mid",
-    "Knight": "high",
-    "Commander": "high",
-    "General": "very high",
-    "Conqueror": "very high",
-    }
-
-    rank_level = Ranks.get(user.rank, "very low")
-
-    if slack_user_id in active_siege:
-        container = active_siege
-        stages = siege_stages
-        battle_type = "siege"
+    user = await users.get(slack_user_id)
 
-    elif slack_user_id in active_raid:
-        container = active_raid     
-        stages = raid_stages
-        battle_type = "raid"
+    rank_level = progression.tier(user.rank)
 
-    elif slack_user_id in active_fortify:
-        container = active_fortify
-        stages = fortify_stages
-        battle_type = 'fortify'
-
-    elif slack_user_id in active_assassination:
-        container = active_assassination
-        stages = assassinate_stages
-        battle_type = 'assassination'
-
-    elif slack_user_id in active_ambush:
-        container = active_ambush
-        stages = []
-        battle_type = "ambush"
-
-    else:
-        respond("You're Not In The Middle of Any Battle Right Now.")
+    active = battles.get(slack_user_id)
+    if not active:
+        await respond("You're Not In The Middle of Any Battle Right Now.")
         return
 
-    respond()
-
-    active = container[slack_user_id]      
-    if not active or "opponents" not in active or active.get("current", 0) >= len(active["opponents"]):
-        respond("No opponents to attack.")
-        container.pop(slack_user_id, None)
-        return
+    battle_type = active.type
+    stages = battle_stages[battle_type]
 
-    if not user or not user.inventory:
-        respond("You Have No Items To Fight With, Use /satchel To Check Your Inventory.")
-        return
-    
-    if not text:
-        respond("Choose a Weapon To Attack With.")
+    if active.finished():
+        await respond("No opponents to attack.")
+        await battles.pop(slack_user_id)
         return
 
-    if text not in user.inventory:
-        respond(f"You Don't Have a *{text}* In Your Satchel, Use /satchel To Check Your Items.")
+    # One primary key lookup per swing, the whole satchel is only looked at to explain a miss
+    if not text or not await inventory.has(user, text):
+        if await inventory.empty(user):
+            await respond("You Have No Items To Fight With, Use /satchel To Check Your Inventory.")
+        elif not text:
+            await respond("Choose a Weapon To Attack With.")
+        else:
+            await respond(f"You Don't Have a *{text}* In Your Satchel, Use /satchel To Check Your Items.")
         return
     
-    weapon = Weapons.get(text)
+    weapon = catalog.weapons.get(text)
     if not weapon:
-        respond(f'*{text}* Is Not a Valid Weapon')
+        await respond(f'*{text}* Is Not a Valid Weapon')
         return
 
     now = time.time()
-    last_time = last_attack.get(slack_user_id)
-    opponent = active['opponents'][active['current']]
+    last_time = active.last_attack
+    index = active.current
+    opponent = active.opponents[index]
 
     if last_time is not None:
         atime = now - last_time
 
         if atime < min_time:
-            dmg = opponent['damage']
+            dmg = opponent.damage
             blocked = min(dmg, user.shield)
             user.shield -= blocked
             dmg -= blocked
             if dmg > 0:
                 user.health -= dmg
-            session.commit()
-            last_attack[slack_user_id] = now
+            stat_buffer.stage(user)
+            active.last_attack = now
+            journal.record(slack_user_id, "parry", battle_type, opponent=opponent.name, damage=opponent.damage)
 
             if user.health <= 0:    
-                container.pop(slack_user_id, None)
-                respond(f"You Attacked Too Fast... *{opponent['name']}* Parried And Killed You!")
+                await battles.pop(slack_user_id)
+                journal.record(slack_user_id, "loss", battle_type, opponent=opponent.name)
+                await respond(f"You Attacked Too Fast... *{opponent.name}* Parried And Killed You!")
                 return
             else:
-                respond(f"""You Attacked Too Fast... *{opponent['name']}* Parried.
+                await battles.put(slack_user_id, active)
+                await respond(f"""You Attacked Too Fast... *{opponent.name}* Parried.
                         
 You Now have:
 {user.health} HP | {user.shield} Shield""")
                 return
 
         elif atime > max_time:
-            dmg = opponent['damage']
+            dmg = opponent.damage
             blocked = min(dmg, user.shield)
             user.shield -= blocked
             dmg -= blocked
             if dmg > 0:
                 user.health -= dmg
-            session.commit()
-            last_attack[slack_user_id] = now
+            stat_buffer.stage(user)
+            active.last_attack = now
+            journal.record(slack_user_id, "hesitation", battle_type, opponent=opponent.name, damage=opponent.damage)
 
             if user.health <= 0:
-                container.pop(slack_user_id, None)
-                respond(f"You Hesitated Too Long... *{opponent['name']}* Struck And Killed You!")
+                await battles.pop(slack_user_id)
+                journal.record(slack_user_id, "loss", battle_type, opponent=opponent.name)
+                await respond(f"You Hesitated Too Long... *{opponent.name}* Struck And Killed You!")
                 return
             else:
-                respond(f"""You Hesitated! *{opponent['name']}* Strikes First.
+                await battles.put(slack_user_id, active)
+                await respond(f"""You Hesitated! *{opponent.name}* Strikes First.
                         
 You Now have: 
 {user.health} HP | {user.shield} Shield""")
@@ -1152,107 +783,105 @@ You Now have:
             
     # Opponent Being Hit
 
-    dmg = weapon['damage']
+    dmg = weapon.damage
 
-    if opponent['shield'] > 0:
-        dmgtaken = min(dmg, opponent['shield'])
-        opponent['shield'] -= dmgtaken
+    if active.shield[index] > 0:
+        dmgtaken = min(dmg, active.shield[index])
+        active.shield[index] -= dmgtaken
         dmg -= dmgtaken
 
     if dmg > 0:
-        opponent['hp'] -= dmg
+        active.hp[index] -= dmg
 
-    last_attack[slack_user_id] = now
-    session.commit()
+    active.last_attack = now
+    journal.record(slack_user_id, "strike", battle_type, opponent=opponent.name, weapon=text, damage=weapon.damage, kills=int(active.hp[index] <= 0))
 
-    if opponent['hp'] <= 0:
+    if active.hp[index] <= 0:
         user.kills += 1
-        active["current"] += 1
-        session.commit()
+        active.current += 1
+        stat_buffer.stage(user)
+        await battles.put(slack_user_id, active)
 
         if battle_type == "ambush":
 
-            amb = active_ambush.get(slack_user_id)
-            if amb:
-                ret = amb.get("return", {})
-
-                orig_opps = ret.get("opponents", [])
-                orig_current = ret.get("current", 0)
-                orig_battle_type = ret.get("battle_type", None)
-                saved_stage_text = ret.get("stage_text", "")
+            suspended = active.resume
+            orig_battle_type = suspended.type if suspended else None
+            saved_stage_text = active.resume_text
+
+
+            if orig_battle_type == "siege":
+                stages = siege_stages
+                battle_type = "siege"
+                xp_count = 20
+            elif orig_battle_type == "raid":
+                stages = raid_stages
+                battle_type = "raid"
+                xp_count = 10
+            elif orig_battle_type == "fortify":
+                stages = fortify_stages
+                battle_type = "fortify"
+                xp_count = 25
+            elif orig_battle_type == "assassination":
+                stages = assassinate_stages
+                battle_type = "assassination"
+                xp_count = 5
+            else:
+                xp_count = 10
+                await battles.pop(slack_user_id)
+                journal.record(slack_user_id, "win", "ambush", xp=xp_count)
+                user.xp += xp_count 
+                stat_buffer.stage(user)
+                await stat_buffer.flush(slack_user_id)
+                await respond(f"*{opponent.name} Falls Before Your Blade.*\n\n{saved_stage_text}\n\n*You Have Gained {xp_count} XP.*")
+                await rank_up(user, respond)
+                return
 
+            active = suspended
+            active.last_attack = now
+            await battles.put(slack_user_id, active)
 
-                active_ambush.pop(slack_user_id, None)
+            if not active.finished():
+                stage_index = active.current
+                if stages:
+                    if stage_index >= len(stages):
+                        stage_index = len(stages) - 2
+                    stage_text = stages[stage_index]
+                else:
+                    stage_text = ""
 
-                if orig_battle_type == "siege":
-                    active_siege[slack_user_id] = {"opponents": orig_opps, "current": orig_current}
-                    container = active_siege
-                    stages = siege_stages
-                    battle_type = "siege"
+                next_index = active.current
+                next_op = active.opponents[next_index]
+                await respond(f"*{opponent.name} Has Been Defeated.*\n\n{stage_text}\n\n*{next_op.name}*\n{active.hp[next_index]} HP | {active.shield[next_index]} Shield | {next_op.damage} Damage | {next_op.level.title()} Tier\n\n*Use /attack To FIGHT!*")
+                return
+            else:
+                user = await users.get(slack_user_id)
+                if battle_type == 'siege':
+                    user.sieges += 1
                     xp_count = 20
-                elif orig_battle_type == "raid":
-                    active_raid[slack_user_id] = {"opponents": orig_opps, "current": orig_current}
-                    container = active_raid
-                    stages = raid_stages
-                    battle_type = "raid"
+                elif battle_type == 'raid': 
+                    user.raids += 1
                     xp_count = 10
-                elif orig_battle_type == "fortify":
-                    active_fortify[slack_user_id] = {"opponents": orig_opps, "current": orig_current}
-                    container = active_fortify
-                    stages = fortify_stages
-                    battle_type = "fortify"
+                elif battle_type == 'fortify':
+                    user.fortifications += 1
                     xp_count = 25
-                elif orig_battle_type == "assassination":
-                    active_assassination[slack_user_id] = {"opponents": orig_opps, "current": orig_current}
-                    container = active_assassination
-                    stages = assassinate_stages
-                    battle_type = "assassination"
+                elif battle_type == 'assassination': 
+                    user.assassinations += 1
                     xp_count = 5
-                else:
-                    user.xp += xp_count 
-                    session.commit()
-                    respond(f"*{opponent['name']} Falls Before Your Blade.*\n\n{saved_stage_text}\n\n*You Have Gained {xp_count} XP.*")
-                    return
-
-                active = container[slack_user_id]
-
-                if active["current"] < len(active["opponents"]):
-                    stage_index = active['current']
-                    if stages:
-                        if stage_index >= len(stages):
-                            stage_index = len(stages) - 2
-                        stage_text = stages[stage_index]
-                    else:
-                        stage_text = ""
-
-                    next_op = active["opponents"][ active["current"] ]
-                    respond(f"*{opponent['name']} Has Been Defeated.*\n\n{stage_text}\n\n*{next_op['name']}*\n{next_op['hp']} HP | {next_op['shield']} Shield | {next_op['damage']} Damage | {next_op['level'].title()} Tier\n\n*Use /attack To FIGHT!*")
-                    return
-                else:
-                    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-                    if battle_type == 'siege':
-                        user.sieges += 1
-                        xp_count = 20
-                    elif battle_type == 'raid': 
-                        user.raids += 1
-                        xp_count = 10
-                    elif battle_type == 'fortify':
-                        user.fortifications += 1
-                        xp_count = 25
-                    elif battle_type == 'assassination': 
-                        user.assassinations += 1
-                        xp_count = 5
-                    user.xp += xp_count
-                    rolled_item = loot_roll(user)
-                    add_item(user, rolled_item)
-                    container.pop(slack_user_id, None)
-                    session.commit()
-                    respond(f"*{opponent['name']} Falls Before Your Blade.*\n\n{stages[-1]}\n\n*You Have Gained {xp_count} XP And a {rolled_item}*")
-                    return
-
-        if active["current"] < len(active["opponents"]):
-
-            stage_index = active['current']
+                user.xp += xp_count
+                rolled_item = loot_roll(user, battle_type)
+                await add_item(user, rolled_item)
+                await battles.pop(slack_user_id)
+                journal.record(slack_user_id, "win", battle_type, xp=xp_count)
+                journal.record(slack_user_id, "loot", battle_type, item=rolled_item)
+                stat_buffer.stage(user)
+                await stat_buffer.flush(slack_user_id)
+                await respond(f"*{opponent.name} Falls Before Your Blade.*\n\n{stages[-1]}\n\n*You Have Gained {xp_count} XP And a {rolled_item}*")
+                await rank_up(user, respond)
+                return
+
+        if not active.finished():
+
+            stage_index = active.current
             if stages:
                 if stage_index >= len(stages):
                     stage_index = len(stages) - 1
@@ -1260,57 +889,44 @@ You Now have:
             else:
                 stage_text = ""
 
-            next_op = active["opponents"][ active["current"] ]
-            respond(f"*{opponent['name']} Falls Before Your Blade.*\n\n{stage_text}\n\n*{next_op['name']}*\n\n{next_op['hp']} HP | {next_op['shield']} Shield | {next_op['damage']} Damage | {next_op['level'].title()} Tier\n\n*Use /attack To FIGHT!*")
+            next_index = active.current
+            next_op = active.opponents[next_index]
+            await respond(f"*{opponent.name} Falls Before Your Blade.*\n\n{stage_text}\n\n*{next_op.name}*\n\n{active.hp[next_index]} HP | {active.shield[next_index]} Shield | {next_op.damage} Damage | {next_op.level.title()} Tier\n\n*Use /attack To FIGHT!*")
             return
 
         if battle_type != 'ambush':
             ambush_chance = 0.1 if rank_level in ('very high', 'high') else 0.00001
             if random.random() < ambush_chance:
-                ambushers = [ (n,d) for n,d in Opponents.items() if d["level"] in ("high","very high") ]
+                ambushers = catalog.tier_opponents("ambush", "high") + catalog.tier_opponents("ambush", "very high")
                 if not ambushers:
-                    ambushers = list(Opponents.items())
-
-
-                name, d = random.choice(ambushers)
-                next_opponent = {
-                    "name": name,
-                    "hp": d["health"],
-                    "shield": d["shield"],
-                    "damage": d["damage"],
-                    "level": d["level"]
-                }
-
-                saved_opponents = copy.deepcopy(active["opponents"])
-                saved_current = active.get("current", 0)
-
-                container.pop(slack_user_id, None) 
-                active_ambush[slack_user_id] = {
-                    "opponents": [next_opponent],
-                    "current": 0,
-                    "return": {
-                        "stage_text": stage_text,
-                        "opponents": saved_opponents, 
-                        "current": saved_current, 
-                        "battle_type": battle_type
-                    }
-                }
-
-
-                respond(f"""*You Have Been Ambushed...*\n\n*As You Go Back To The Castle, You Notice People Following You...*\n*They start getting closer and closer until you suddenly find someone attacking you, it's...*\n\n*{next_opponent['name']}*\n{next_opponent['hp']} HP | {next_opponent['shield']} Shield | {next_opponent['damage']} Damage | {next_opponent['level'].title()} Tier\n\n*Use /attack To FIGHT!*""")
+                    ambushers = tuple(catalog.opponents["ambush"])
+
+
+                name = random.choice(ambushers)
+
+                ambush = await battles.start(slack_user_id, "ambush", [name], last_attack=now, resume=active, resume_text=stage_text)
+                next_opponent = ambush.opponents[0]
+                journal.record(slack_user_id, "ambush", battle_type, opponent=name)
+
+
+                await respond(f"""*You Have Been Ambushed...*\n\n*As You Go Back To The Castle, You Notice People Following You...*\n*They start getting closer and closer until you suddenly find someone attacking you, it's...*\n\n*{next_opponent.name}*\n{next_opponent.health} HP | {next_opponent.shield} Shield | {next_opponent.damage} Damage | {next_opponent.level.title()} Tier\n\n*Use /attack To FIGHT!*""")
                 return
 
-        container.pop(slack_user_id, None)
-        user.xp += 10
+        await battles.pop(slack_user_id)
+        xp_count = 10
+        user.xp += xp_count
         if battle_type == 'siege': user.sieges += 1
         elif battle_type == 'raid': user.raids += 1
         elif battle_type == 'fortify': user.fortifications += 1
         elif battle_type == 'assassination': user.assassinations += 1
-        session.commit()
-        respond(f"*{opponent['name']} Falls Before Your Blade.*\n\n{(stages[-1] if stages else '')}\n*You Have Gained {xp_count} XP*")
+        journal.record(slack_user_id, "win", battle_type, xp=xp_count)
+        stat_buffer.stage(user)
+        await stat_buffer.flush(slack_user_id)
+        await respond(f"*{opponent.name} Falls Before Your Blade.*\n\n{(stages[-1] if stages else '')}\n*You Have Gained {xp_count} XP*")
+        await rank_up(user, respond)
         return
 
-    stage_index = active['current']
+    stage_index = active.current
     if stages:
         if stage_index >= len(stages):
             stage_index = len(stages) - 1
@@ -1318,24 +934,19 @@ You Now have:
     else:
         stage_text = ""
 
-    respond(f"You Strike With Your *{text}*\n\n*{opponent['name']}* Now Has:\n\n{opponent['hp']} HP | {opponent['shield']} Shield")
+    await battles.put(slack_user_id, active)
+    await respond(f"You Strike With Your *{text}*\n\n*{opponent.name}* Now Has:\n\n{active.hp[index]} HP | {active.shield[index]} Shield")
 
-    dmg_to_player = opponent['damage']
+    dmg_to_player = opponent.damage
     blocked = min(dmg_to_player, user.shield)
     user.shield -= blocked
     dmg_to_player -= blocked
     if dmg_to_player > 0:
         user.health -= dmg_to_player
-    session.commit()
+    stat_buffer.stage(user)
+    journal.record(slack_user_id, "counter", battle_type, opponent=opponent.name, damage=opponent.damage)
 
     if user.health <= 0:
-        time.sleep(1.5)
-        container.pop(slack_user_id, None)
-        if user.xp > 20:
-            user.xp -= 5
-        else: 
-            user.xp = 0
-
         if battle_type == "siege":
             lose_text = """*the battlefield fading into a haze of blood and smoke.*
 *Just as the darkness closes in, two familiar figures break through the chaos, Heidi and Orpheus.*
@@ -1374,17 +985,17 @@ You Now have:
 
 
     if user.health <= 0:
-        time.sleep(1.5)
-        container.pop(slack_user_id, None)
-        if user.xp > 20:
-            user.xp -= 5
-        else: 
-            user.xp = 0
+        await pause()
+        await battles.pop(slack_user_id)
+        xp_count = 5 if user.xp > 20 else user.xp
+        user.xp -= xp_count
+        journal.record(slack_user_id, "loss", battle_type, opponent=opponent.name, xp=-xp_count)
         
-        session.commit()
+        stat_buffer.stage(user)
+        await stat_buffer.flush(slack_user_id)
 
 
-        respond(f"""*{opponent['name']} Has Struck You Down. Your Vision Blurs,*
+        await respond(f"""*{opponent.name} Has Struck You Down. Your Vision Blurs,*
                     
 {lose_text}
 
@@ -1392,98 +1003,66 @@ You Now have:
 
 
     else:
-        time.sleep(1.5)
-        respond(f"""*{opponent['name']}* Has Attacked You. 
+        await pause()
+        await respond(f"""*{opponent.name}* Has Attacked You. 
                     
 You Now Have:
                     
 {user.health} HP | {user.shield} Shield""")
         
 
-    if user.xp >= 5000:
-        user.rank = 'Warchief'
-        respond(f""" You Have Ranked Up...
-
-The Warlord has been watching your battles, He called you to talk.
-You go talk to him and to your surprise, He has decided you are now the Warchief, The Warlord's Right Hand Man.""")
-    elif user.xp >= 3000:
-        user.rank = 'Conqueror'
-        respond(f""" You Have Ranked Up...
+    await rank_up(user, respond)
 
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    elif user.xp >= 2000:
-        user.rank = 'Commander'
-        respond(f""" You Have Ranked Up...
 
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    elif user.xp >= 1500:
-        user.rank = 'Knight'
-        respond(f""" You Have Ranked Up...
+@command('/exit')
+async def exit(ack, respond, command):
+    await ack()
 
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    elif user.xp >= 1000:
-        user.rank = 'Champion'
-        respond(f""" You Have Ranked Up...
-
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    elif user.xp >= 800:
-        user.rank = 'Veteran'
-        respond(f""" You Have Ranked Up...
+    slack_user_id = command['user_id']
 
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    elif user.xp >= 600:
-        user.rank = 'Raider'
-        respond(f""" You Have Ranked Up...
+    fled = {
+        "siege": '*You Have Fled The Siege... Traitor.*',
+        "raid": '*You Have Fled The Raid... Traitor.*',
+        "fortify": "*You Have Ran Away From Defending The Castle... Traitor.*",
+        "assassination": "*You Have Fled The Assassination... Traitor.*",
+    }
+    battle = battles.get(slack_user_id)
 
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    elif user.xp >= 400:
-        user.rank = 'Soldier'
-        respond(f""" You Have Ranked Up...
+    if battle and battle.type in fled:
+        await battles.pop(slack_user_id)
+        journal.record(slack_user_id, "flee", battle.type)
+        await respond(fled[battle.type])
+    else:
+        await respond("You're Not In The Middle of Any Battle Right Now.")
+        return
 
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    elif user.xp >= 200:
-        user.rank = 'Footman'
-        respond(f""" You Have Ranked Up...
+    await stat_buffer.flush(slack_user_id)
 
-The Warlord has been watching your battles and, impressed by your skills, has decided that you deserve a rank up.
-You Are Now a {user.rank}""")
-    else:
-        user.rank = 'Recruit'
 
+@command('/kill-count')
+async def kill_count(ack, respond, command):
+    await ack()
 
-@app.command('/exit')
-def exit(ack, respond, command):
-    ack()
-    global active_siege, active_raid, active_fortify
+    text = (command.get("text") or "").strip()
 
-    slack_user_id = command['user_id']
+    if text.startswith('@'):
+        slack_user_id = text
+        is_self = slack_user_id == command['user_id']
+    else:
+        slack_user_id = command['user_id']
+        is_self = True
 
-    if slack_user_id in active_siege:
-        del active_siege[slack_user_id]
-        respond ('*You Have Fled The Siege... Traitor.*')
-    elif slack_user_id in active_raid:
-        del active_raid[slack_user_id]
-        respond ('*You Have Fled The Raid... Traitor.*')
-    elif slack_user_id in active_fortify:
-        del active_fortify[slack_user_id]
-        respond("*You Have Ran Away From Defending The Castle... Traitor.*")
-    elif slack_user_id in active_assassination:
-        del active_assassination[slack_user_id]
-        respond("*You Have Fled The Assassination... Traitor.*")
+    user = await profile(slack_user_id)
+    
+    if is_self:
+        await respond(f"You Have Killed {user.kills} Enemies.")
     else:
-        respond("You're Not In The Middle of Any Battle Right Now.")
+        await respond(f"<{slack_user_id}> Has Killed {user.kills} Enemies")
 
 
-@app.command('/kill-count')
-def kill_count(ack, respond, command):
-    ack()
+@command('/siege-count')
+async def siege_count(ack, respond, command):
+    await ack()
 
     text = (command.get("text") or "").strip()
 
@@ -1494,21 +1073,17 @@ def kill_count(ack, respond, command):
         slack_user_id = command['user_id']
         is_self = True
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
+    user = await profile(slack_user_id)
     
     if is_self:
-        respond(f"You Have Killed {user.kills} Enemies.")
+        await respond(f"You Have Won {user.sieges} Sieges.")
     else:
-        respond(f"<{slack_user_id}> Has Killed {user.kills} Enemies")
+        await respond(f"<{slack_user_id}> Has Won {user.sieges} Sieges")
 
 
-@app.command('/siege-count')
-def siege_count(ack, respond, command):
-    ack()
+@command('/raid-count')
+async def raid_count(ack, respond, command):
+    await ack()
 
     text = (command.get("text") or "").strip()
 
@@ -1519,21 +1094,17 @@ def siege_count(ack, respond, command):
         slack_user_id = command['user_id']
         is_self = True
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
+    user = await profile(slack_user_id)
     
     if is_self:
-        respond(f"You Have Won {user.sieges} Sieges.")
+        await respond(f"You Have Won {user.raids} Raids.")
     else:
-        respond(f"<{slack_user_id}> Has Won {user.sieges} Sieges")
-
+        await respond(f"<{slack_user_id}> Has Won {user.raids} Raids")
 
-@app.command('/raid-count')
-def raid_count(ack, respond, command):
-    ack()
+        
+@command('/fortify-count')
+async def fortify_count(ack, respond, command):
+    await ack()
 
     text = (command.get("text") or "").strip()
 
@@ -1544,21 +1115,16 @@ def raid_count(ack, respond, command):
         slack_user_id = command['user_id']
         is_self = True
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
+    user = await profile(slack_user_id)
     
     if is_self:
-        respond(f"You Have Won {user.raids} Raids.")
+        await respond(f"You Have Defended The Castle {user.fortifications} Times.")
     else:
-        respond(f"<{slack_user_id}> Has Won {user.raids} Raids")
+        await respond(f"<{slack_user_id}> Has Defended The Castle {user.fortifications} Times")
 
-        
-@app.command('/fortify-count')
-def fortify_count(ack, respond, command):
-    ack()
+@command('/assassination-count')
+async def assassination_count(ack, respond, command):
+    await ack()
 
     text = (command.get("text") or "").strip()
 
@@ -1569,20 +1135,16 @@ def fortify_count(ack, respond, command):
         slack_user_id = command['user_id']
         is_self = True
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
+    user = await profile(slack_user_id)
     
     if is_self:
-        respond(f"You Have Defended The Castle {user.fortifications} Times.")
+        await respond(f"You Have Done {user.assassinations} Assassinations.")
     else:
-        respond(f"<{slack_user_id}> Has Defended The Castle {user.fortifications} Times")
+        await respond(f"<{slack_user_id}> Has Done {user.sieges} Assassinations")
 
-@app.command('/assassination-count')
-def assassination_count(ack, respond, command):
-    ack()
+@command('/stats')
+async def stats(ack, respond, command):
+    await ack()
 
     text = (command.get("text") or "").strip()
 
@@ -1593,32 +1155,166 @@ def assassination_count(ack, respond, command):
         slack_user_id = command['user_id']
         is_self = True
 
-    user = session.query(User).filter_by(slack_id=slack_user_id).first()
-    if not user:
-        user = User(slack_id=slack_user_id)
-        session.add(user)
-        session.commit()
-    
+    user = await profile(slack_user_id)
+
     if is_self:
-        respond(f"You Have Done {user.assassinations} Assassinations.")
+        header = "*Your Stats*"
     else:
-        respond(f"<{slack_user_id}> Has Done {user.sieges} Assassinations")
+        header = f"*<{slack_user_id}>'s Stats*"
+
+    await respond(f"""{header}
+
+Rank: *{user.rank}* ({user.xp} XP)
+{user.health} HP | {user.shield} Shield
+
+Kills: {user.kills}
+Sieges Won: {user.sieges}
+Raids Won: {user.raids}
+Castle Defended: {user.fortifications} Times
+Assassinations: {user.assassinations}
+Items In Satchel: {sum(user.inventory.values())}""")
 
-@app.command('/leaderboard')
-def leaderboard(ack, respond, command):
-    ack()
-    top_users = session.query(User).order_by(User.xp.desc()).limit(10).all()
+
+@command('/leaderboard')
+async def leaderboard(ack, respond, command):
+    await ack()
+
+    stat = "xp"
+    page = 1
+    for word in (command.get("text") or "").split():
+        if word.isdigit():
+            page = max(1, int(word))
+        elif parse_stat(word):
+            stat = parse_stat(word)
+        else:
+            await respond(f"*{word}* Is Not a Leaderboard, Choose From: {', '.join(STATS)}.")
+            return
+
+    top_users = await leaderboards.page(stat, page)
 
     if not top_users:
-        respond("No warriors have stepped onto the field yet.")
+        if page == 1:
+            await respond("No warriors have stepped onto the field yet.")
+        else:
+            await respond(f"There's Nobody On Page {page} Yet.")
         return
     
-    leaderboard = "*Leaderboard*\n"
-    for i, user in enumerate(top_users, start=1):
-        leaderboard += f"{i}. <@{user.slack_id}> — {user.rank} ({user.xp} XP)\n"
+    if stat == "xp":
+        leaderboard = "*Leaderboard*\n"
+    else:
+        leaderboard = f"*Leaderboard — {STATS[stat]}*\n"
+    if page > 1:
+        leaderboard += f"_Page {page}_\n"
+
+    for i, (slack_id, rank, value) in enumerate(top_users, start=(page - 1) * PAGE_SIZE + 1):
+        if stat == "xp":
+            leaderboard += f"{i}. <@{slack_id}> — {rank} ({value} XP)\n"
+        else:
+            leaderboard += f"{i}. <@{slack_id}> — {value} {STATS[stat]}\n"
+
+    if len(top_users) == PAGE_SIZE:
+        leaderboard += f"\nUse */leaderboard {stat} {page + 1}* To See The Next Page."
+
+    await respond(leaderboard)
+
+@command('/wl-profile')
+async def profiling(ack, respond, command):
+    await ack()
 
-    respond(leaderboard)
+    if command['user_id'] not in ADMIN_IDS:
+        await respond("Only The Warlord's Scribes Can Do That.")
+        return
+
+    args = command.get('text', '').split()
+    action = args[0].lower() if args else "status"
+
+    if action == "on":
+        try:
+            profiler.set_rate(float(args[1]) if len(args) > 1 else 0.1)
+        except ValueError as e:
+            await respond(f"Usage: */wl-profile on (rate)*, with a rate between 0 and 1. {e}")
+            return
+        await respond(f"Profiling {profiler.rate:.0%} of commands.")
+    elif action == "off":
+        profiler.set_rate(0)
+        await respond("Profiling is off. Use */wl-profile dump* to write what was gathered.")
+    elif action == "dump":
+        written = dump_profiles()
+        await respond(f"Wrote {len(written)} files to {profiler.directory}." if written else "Nothing has been sampled yet.")
+    else:
+        sampled = ", ".join(f"{name} {count}" for name, count in sorted(profiler.samples.items())) or "nothing yet"
+        state = f"on for {profiler.rate:.0%} of commands" if profiler.enabled else "off"
+        await respond(f"Profiling is {state}. Sampled: {sampled}.\nUse */wl-profile on (rate)*, */wl-profile off* or */wl-profile dump*.")
+
+def dump_profiles():
+    written = profiler.dump()
+    for path in written:
+        print(f"Profile written to {path}")
+    return written
+
+async def startup():
+    await check_settings()
+    await create_tables()
+    moved = await inventory.migrate()
+    if moved:
+        print(f"Moved {moved} satchels into inventory_items")
+    await journal.create_tables()
+    seeded = await journal.seed()
+    if seeded:
+        print(f"Journal: {seeded} players start from their current stats")
+    state.configure()
+    await battles.load()
+    await cooldowns.load()
+    if os.environ.get("COOLDOWN_DMS"):
+        cooldowns.on_ready = cooldown_ready
+    reaper.on_forfeit = battle_forfeited
+    reaper.busy = user_locks.held
+    outbound.start()
+    stat_buffer.start()
+    journal.start()
+    cooldowns.start()
+    reaper.start()
+    await metrics_server.start()
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, dump_profiles)
+
+async def shutdown():
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+    await metrics_server.close()
+    await reaper.close()
+    await cooldowns.close()
+    await state.close()
+    await stat_buffer.close()
+    await journal.close()
+    await outbound.close()
+    await engine.dispose()
+
+def stop_on_sigterm():
+    # systemd and docker stop the bot with SIGTERM, cancelling main runs the same shutdown as Ctrl-C
+    task = asyncio.current_task()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    except NotImplementedError:
+        # Windows event loops can't take signal handlers, there Ctrl-C is the only clean stop
+        pass
+
+async def main():
+    stop_on_sigterm()
+    await startup()
+
+    handler = AsyncSocketModeHandler(app, os.environ["APP_TOKEN"])
+    try:
+        await handler.start_async()
+    finally:
+        try:
+            await handler.close_async()
+        finally:
+            await shutdown()
 
 if __name__ == "__main__":
-    handler = SocketModeHandler(app, os.environ["APP_TOKEN"])
-    handler.start()
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except asyncio.CancelledError:
+        # Stopped by SIGTERM, shutdown already ran
+        pass
\ No newline at end of file
@@ -0,0 +1,101 @@
+import json
+import os
+from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+
+# Game content catalog
+#
+# Items, loot weights, opponents and the rank ladder live in content.json.
+# They're read once at import and compiled into read-only lookups, so mission starts and /attack never scan a table.
+
+CONTENT_VERSION = 3
+CONTENT_PATH = Path(os.environ.get("WARLORD_CONTENT", Path(__file__).with_name("content.json")))
+
+class Item(NamedTuple):
+    id: int
+    name: str
+    unique: bool
+    damage: int = 0
+    heal: int = 0
+    shield: int = 0
+
+class Rank(NamedTuple):
+    name: str
+    xp: int
+    tier: str
+
+class Opponent(NamedTuple):
+    name: str
+    health: int
+    shield: int
+    damage: int
+    level: str
+
+class Catalog:
+
+    def __init__(self, data):
+        version = data.get("version")
+        if version != CONTENT_VERSION:
+            raise ValueError(f"content.json is version {version}, this bot reads version {CONTENT_VERSION}")
+        self.version = version
+
+        self.tiers = tuple(data["tiers"])
+
+        # Ranks in the order they're earned, each with the XP it takes and the tier it fights at
+        self.ranks = tuple(Rank(r["name"], r["xp"], r["tier"]) for r in data["ranks"])
+        if not self.ranks or self.ranks[0].xp != 0:
+            raise ValueError("content.json ranks must start with a rank at 0 XP")
+        if any(a.xp >= b.xp for a, b in zip(self.ranks, self.ranks[1:])):
+            raise ValueError("content.json ranks must be in ascending XP order")
+        unknown = [r.name for r in self.ranks if r.tier not in self.tiers]
+        if unknown:
+            raise ValueError(f"content.json ranks have unknown tiers: {unknown}")
+
+        items = {}
+        for name, entry in data["items"].items():
+            items[name] = Item(entry["id"], name, entry["unique"], entry.get("damage", 0), entry.get("heal", 0), entry.get("shield", 0))
+        if len({item.id for item in items.values()}) != len(items):
+            raise ValueError("content.json has two items with the same id")
+
+        self.items = MappingProxyType(items)
+        self.item_ids = MappingProxyType({name: item.id for name, item in items.items()})
+        self.items_by_id = MappingProxyType({item.id: item for item in items.values()})
+        self.weapons = MappingProxyType({name: item for name, item in items.items() if item.damage})
+        self.healable = MappingProxyType({name: item for name, item in items.items() if item.heal})
+        self.armor = MappingProxyType({name: item for name, item in items.items() if item.shield})
+
+        # Loot weights per mission type ("default" covers any mission without its own table), then per tier
+        loot = {}
+        for mission, by_tier in data["loot"].items():
+            for tier, weights in by_tier.items():
+                unknown = [name for name in weights if name not in items]
+                if unknown:
+                    raise ValueError(f"content.json loot for {mission}/{tier} names unknown items: {unknown}")
+            loot[mission] = MappingProxyType({tier: tuple(weights.items()) for tier, weights in by_tier.items()})
+        if "default" not in loot:
+            raise ValueError("content.json needs a default loot table")
+        self.loot = MappingProxyType(loot)
+
+        tables = {}
+        tiers = {}
+        for table_name, table in data["opponents"].items():
+            opponents = {name: Opponent(name, o["health"], o["shield"], o["damage"], o["level"]) for name, o in table.items()}
+            tables[table_name] = MappingProxyType(opponents)
+            tiers[table_name] = MappingProxyType({
+                tier: tuple(name for name, o in opponents.items() if o.level == tier)
+                for tier in self.tiers
+            })
+
+        # Several battle types fight from the same table (fortify and ambush use the siege roster)
+        self.opponents = MappingProxyType({battle: tables[table] for battle, table in data["battles"].items()})
+        self.opponents_by_tier = MappingProxyType({battle: tiers[table] for battle, table in data["battles"].items()})
+
+    def tier_opponents(self, battle_type, tier):
+        return self.opponents_by_tier[battle_type][tier]
+
+def load_catalog(path=CONTENT_PATH):
+    with open(path, encoding="utf-8") as f:
+        return Catalog(json.load(f))
+
+catalog = load_catalog()
@@ -0,0 +1,144 @@
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from aiohttp import web
+import outbound
+from outbound import Dispatcher, Message
+
+# Outbound check
+#
+# Runs the dispatcher against a local aiohttp stand-in for Slack, no network or token needed, and checks that
+# a 429 holds every worker for its Retry-After, a 5xx is retried, response_url posts keep their order and
+# messages still queued at shutdown are spooled to disk and sent on the next start.
+#
+#   python check_outbound.py             exit 1 if any check fails
+
+class StandIn:
+    # Answers like Slack would, with a few scripted failures keyed by message text
+
+    def __init__(self):
+        self.received = []
+        self.limited = 1
+        self.failing = 1
+        self.release = asyncio.Event()
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        body = await request.json()
+        text = body.get("text")
+        if text == "limited" and self.limited:
+            self.limited -= 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        if text == "flaky" and self.failing:
+            self.failing -= 1
+            return web.Response(status=500)
+        if text == "stalled" and not self.release.is_set():
+            # The sender gives up on this one at shutdown, so it isn't counted as received
+            await self.release.wait()
+            return web.json_response({"ok": True})
+        self.received.append((time.monotonic(), request.path, body.get("channel"), text, request.headers.get("Authorization")))
+        return web.json_response({"ok": True})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+
+    async def close(self):
+        await self.runner.cleanup()
+
+    def arrived(self, text):
+        return [at for at, _, _, received, _ in self.received if received == text]
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+async def run():
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    outbound.BACKOFF = 0.1
+    stand_in = StandIn()
+    await stand_in.start()
+    spool = Path(tempfile.mkdtemp(prefix="warlord-outbound-")) / "spool.jsonl"
+
+    def dispatcher():
+        return Dispatcher(token="xoxb-check", api_url=f"{stand_in.url}/api/", spool_path=spool, workers=4)
+
+    sender = dispatcher()
+    sender.start()
+    try:
+        start = time.monotonic()
+        sender.post_message("U1", "limited")
+        await wait_for(lambda: sender.paused_until > 0)
+        # Sent by another worker while the 429 is being sat out, it has to wait as well
+        worker = sender.queue_for(Message("api", "chat.postMessage", {"channel": "U1"}))
+        other = next(f"U{n}" for n in range(2, 100) if sender.queue_for(Message("api", "chat.postMessage", {"channel": f"U{n}"})) is not worker)
+        sender.post_message(other, "bystander")
+        sender.post_message("U3", "flaky")
+        await wait_for(lambda: stand_in.arrived("limited") and stand_in.arrived("bystander") and stand_in.arrived("flaky"))
+
+        limited, bystander = stand_in.arrived("limited"), stand_in.arrived("bystander")
+        check(limited and limited[0] - start >= 1.0, "a 429 is retried after its Retry-After")
+        check(bystander and bystander[0] - start >= 1.0, "a 429 pauses the other workers too")
+        check(len(stand_in.arrived("flaky")) == 1, "a 500 is retried until it goes through")
+        check(all(auth == "Bearer xoxb-check" for _, path, _, _, auth in stand_in.received if path.startswith("/api/")), "Web API calls carry the token")
+
+        send = sender.responder(None, {"response_url": f"{stand_in.url}/hook/1"})
+        for text in ("first", "second", "third"):
+            await send(text=text)
+        await wait_for(lambda: stand_in.arrived("third"))
+        hooked = [text for _, path, _, text, _ in stand_in.received if path == "/hook/1"]
+        check(hooked == ["first", "second", "third"], "response_url posts arrive in order")
+
+        sender.post_message("U4", "stalled")
+        sender.post_message("U4", "queued behind")
+        await asyncio.sleep(0.1)
+    finally:
+        await sender.close(timeout=0.3)
+
+    spooled = spool.read_text(encoding="utf-8").splitlines() if spool.exists() else []
+    check(len(spooled) == 2 and "stalled" in spooled[0] and "queued behind" in spooled[1], "unsent messages are spooled in order at shutdown")
+
+    stand_in.release.set()
+    restarted = dispatcher()
+    restarted.start()
+    try:
+        await wait_for(lambda: stand_in.arrived("queued behind"))
+        check(not spool.exists(), "the spool is taken back on start")
+        sent = [text for _, _, channel, text, _ in stand_in.received if channel == "U4"]
+        check(sent == ["stalled", "queued behind"], "spooled messages are sent after a restart, in order")
+    finally:
+        await restarted.close(timeout=1.0)
+        await stand_in.close()
+
+    check(sender.dropped == 0 and restarted.dropped == 0, "nothing was dropped")
+    return failures
+
+def main():
+    failures = asyncio.run(run())
+    if failures:
+        print(f"{len(failures)} checks failed")
+        return 1
+    print("All outbound checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
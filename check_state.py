@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Shared state check
+#
+# Runs two "processes" (separate battle stores, cooldown services, reapers and player locks, each with its own
+# client) against one in-process fakeredis server, or a real one with --redis-url, and checks that they agree:
+# a battle or cooldown written by one is seen by the other after a sync, an idle battle is forfeited by exactly
+# one reaper, an ended cooldown is announced once, and one player's commands never run on both at once.
+#
+#   python check_state.py                                   needs fakeredis (pip install "fakeredis[lua]")
+#   python check_state.py --redis-url redis://localhost:6379/15    uses that database, and flushes it first
+
+# The reapers record forfeits, so the database has to be in place before db.py is imported
+_workdir = tempfile.mkdtemp(prefix="warlord-state-")
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{_workdir}/state.db"
+os.environ["DB_ECHO"] = "0"
+
+from sqlalchemy import select, func
+from db import Session, create_tables, engine
+from battles import BattleStore
+from cooldowns import CooldownService
+from reaper import BattleReaper, Forfeit
+from locks import UserLocks
+from state import RedisBattles, RedisCooldowns, RedisLocks
+
+class Process:
+    # What one bot process holds in memory, on top of its own connection to Redis
+
+    def __init__(self, client):
+        self.client = client
+        self.battles = BattleStore(RedisBattles(client))
+        self.cooldowns = CooldownService(RedisCooldowns(client))
+        self.reaper = BattleReaper(store=self.battles, ttl=60)
+        self.locks = UserLocks()
+        self.locks.backend = RedisLocks(client)
+
+async def run(connect, flush=False):
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    await create_tables()
+    first, second = Process(connect()), Process(connect())
+    if flush:
+        await first.client.flushdb()
+
+    battle = await first.battles.start("U1", "siege", ["Peasant"])
+    await second.battles.sync("U1")
+    seen = second.battles.get("U1")
+    check(seen is not None and seen.type == "siege" and list(seen.hp) == list(battle.hp), "a battle started on one process is seen by the other")
+
+    seen.hp[0] -= 7
+    seen.current = 0
+    await second.battles.put("U1", seen)
+    await first.battles.sync("U1")
+    check(first.battles.get("U1").hp[0] == battle.hp[0] - 7, "a change on the other process comes back on sync")
+
+    await first.battles.pop("U1")
+    await second.battles.sync("U1")
+    check(second.battles.get("U1") is None, "an ended battle is gone everywhere after sync")
+
+    # Both reapers find the same idle battle, only one may settle it
+    await first.battles.start("U2", "raid", [])
+    await second.battles.sync("U2")
+    forfeited = []
+
+    async def forfeit(slack_id, battle):
+        forfeited.append(slack_id)
+    first.reaper.on_forfeit = second.reaper.on_forfeit = forfeit
+    later = time.time() + 120
+    await asyncio.gather(first.reaper.sweep(later), second.reaper.sweep(later))
+    async with Session() as session:
+        rows = await session.scalar(select(func.count()).select_from(Forfeit).where(Forfeit.slack_id == "U2"))
+    check(forfeited == ["U2"] and rows == 1, "an idle battle is forfeited by exactly one reaper")
+
+    # A cooldown both processes know about ends, only one may announce it
+    await first.cooldowns.trigger("U3", "raid", now=time.time() - (3 * 60 * 60) + 0.5)
+    await second.cooldowns.sync("U3")
+    check(second.cooldowns.remaining("U3", "raid") > 0, "a cooldown started on one process is seen by the other")
+    await second.cooldowns.load()
+    announced = []
+
+    async def ready(slack_id, kind):
+        announced.append((slack_id, kind))
+    first.cooldowns.on_ready = second.cooldowns.on_ready = ready
+    await asyncio.sleep(0.6)
+    await asyncio.gather(first.cooldowns.expire(), second.cooldowns.expire())
+    check(announced == [("U3", "raid")], "an ended cooldown is announced once")
+    await second.cooldowns.sync("U3")
+    check(second.cooldowns.remaining("U3", "raid") == 0, "an ended cooldown's key has expired")
+
+    # The same player's commands on both processes, each reading and writing back a counter
+    counter = {"value": 0, "running": 0, "most": 0}
+
+    async def command(ack, respond, command):
+        counter["running"] += 1
+        counter["most"] = max(counter["most"], counter["running"])
+        value = counter["value"]
+        await asyncio.sleep(0.005)
+        counter["value"] = value + 1
+        counter["running"] -= 1
+    handlers = [first.locks.serialized(command), second.locks.serialized(command)]
+    await asyncio.gather(*(handlers[n % 2](None, None, {"user_id": "U4"}) for n in range(20)))
+    check(counter["value"] == 20 and counter["most"] == 1, "one player's commands take turns across processes")
+    check(not await first.client.exists(first.locks.backend.key("U4")), "the player's lock is released")
+
+    await first.client.set(first.locks.backend.key("U5"), "someone else")
+    await first.locks.backend.release("U5", "stale token")
+    check(await first.client.exists(first.locks.backend.key("U5")), "a stale token doesn't release another holder's lock")
+
+    for process in (first, second):
+        await process.client.aclose()
+    await engine.dispose()
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Redis state backend with two in-process bot processes.")
+    parser.add_argument("--redis-url", help="a real Redis to use instead of fakeredis, its database is flushed")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        import redis.asyncio
+
+        def connect():
+            return redis.asyncio.from_url(args.redis_url)
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            print('fakeredis is not installed, pip install "fakeredis[lua]" or pass --redis-url')
+            return 1
+        server = fakeredis.FakeServer()
+
+        def connect():
+            return fakeredis.FakeAsyncRedis(server=server)
+
+    failures = asyncio.run(run(connect, flush=bool(args.redis_url)))
+    if failures:
+        print(f"{len(failures)} checks failed")
+        return 1
+    print("All shared state checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
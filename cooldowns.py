@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import time
+from sqlalchemy import Column, String, Float, select, delete, and_, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from db import Base, Session
+
+# Cooldowns
+#
+# One row per player and mission type that is still resting, holding the wall-clock time it's ready again.
+# Checks are served from `cache`; a min-heap of expiries lets the background task wake only for the
+# cooldowns that are actually ending, drop them and tell the player (when `on_ready` is set).
+
+DURATIONS = {
+    "siege": 12 * 60 * 60,
+    "raid": 3 * 60 * 60,
+    "fortify": 24 * 60 * 60,
+    "assassination": 1 * 60 * 60,
+}
+
+# The expiry task re-reads the wall clock at least this often, so a clock that jumps is noticed
+MAX_SLEEP = 60.0
+
+class Cooldown(Base):
+    __tablename__ = 'cooldowns'
+    slack_id = Column(String, primary_key=True)
+    kind = Column(String, primary_key=True)
+    ready_at = Column(Float, nullable=False, index=True)
+
+class SQLCooldowns:
+    # The default backend, the cooldowns table
+    shared = False
+
+    async def load(self, now):
+        async with Session() as session, session.begin():
+            rows = (await session.scalars(select(Cooldown).where(Cooldown.ready_at > now))).all()
+            # Cooldowns that ran out while the bot was down are just dropped
+            await session.execute(delete(Cooldown).where(Cooldown.ready_at <= now))
+        return {(row.slack_id, row.kind): row.ready_at for row in rows}
+
+    async def fetch(self, slack_id):
+        async with Session() as session:
+            rows = (await session.execute(select(Cooldown.kind, Cooldown.ready_at).where(Cooldown.slack_id == slack_id))).all()
+        return dict(rows)
+
+    async def save(self, slack_id, kind, ready_at):
+        stmt = insert(Cooldown).values(slack_id=slack_id, kind=kind, ready_at=ready_at)
+        stmt = stmt.on_conflict_do_update(index_elements=[Cooldown.slack_id, Cooldown.kind], set_={"ready_at": ready_at})
+        async with Session() as session, session.begin():
+            await session.execute(stmt)
+
+    async def claim(self, due):
+        # Drops the cooldowns that ended and returns the ones this process should announce, here all of them
+        table = Cooldown.__table__
+        stmt = delete(table).where(and_(
+            table.c.slack_id == bindparam("b_slack_id"),
+            table.c.kind == bindparam("b_kind"),
+            table.c.ready_at == bindparam("b_ready_at"),
+        ))
+        async with Session() as session, session.begin():
+            await session.execute(stmt, [{"b_slack_id": s, "b_kind": k, "b_ready_at": r} for s, k, r in due])
+        return due
+
+class CooldownService:
+
+    def __init__(self, backend=None):
+        self.cache = {}
+        self.heap = []
+        self.on_ready = None
+        self.wake = asyncio.Event()
+        self.task = None
+        self.backend = backend or SQLCooldowns()
+
+    async def load(self):
+        self.cache = await self.backend.load(time.time())
+        self.heap = [(ready_at, slack_id, kind) for (slack_id, kind), ready_at in self.cache.items()]
+        heapq.heapify(self.heap)
+        return len(self.cache)
+
+    async def sync(self, slack_id):
+        # With a backend other processes write to, re-reads the player's cooldowns before a command checks them
+        if not self.backend.shared:
+            return
+        ready = await self.backend.fetch(slack_id)
+        for kind in DURATIONS:
+            if kind in ready:
+                self.cache[(slack_id, kind)] = ready[kind]
+            else:
+                self.cache.pop((slack_id, kind), None)
+
+    def remaining(self, slack_id, kind):
+        ready_at = self.cache.get((slack_id, kind))
+        if ready_at is None:
+            return 0
+        # Never more than a full cooldown, even if the clock was set back since it started
+        return max(0, min(ready_at - time.time(), DURATIONS[kind]))
+
+    async def trigger(self, slack_id, kind, now=None):
+        ready_at = (now if now is not None else time.time()) + DURATIONS[kind]
+        self.cache[(slack_id, kind)] = ready_at
+        await self.backend.save(slack_id, kind, ready_at)
+
+        if not self.heap or ready_at < self.heap[0][0]:
+            self.wake.set()
+        heapq.heappush(self.heap, (ready_at, slack_id, kind))
+        return ready_at
+
+    async def expire(self):
+        now = time.time()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            ready_at, slack_id, kind = heapq.heappop(self.heap)
+            # A cooldown that was started again left its old heap entry behind, skip it
+            if self.cache.get((slack_id, kind)) == ready_at:
+                del self.cache[(slack_id, kind)]
+                due.append((slack_id, kind, ready_at))
+
+        if not due:
+            return 0
+
+        due = await self.backend.claim(due)
+
+        if self.on_ready is not None:
+            for slack_id, kind, _ in due:
+                try:
+                    await self.on_ready(slack_id, kind)
+                except Exception as e:
+                    print(f"Cooldown notice for {slack_id} failed: {e!r}")
+        return len(due)
+
+    async def run(self):
+        while True:
+            self.wake.clear()
+            delay = MAX_SLEEP
+            if self.heap:
+                delay = min(delay, self.heap[0][0] - time.time())
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.expire()
+            except Exception as e:
+                print(f"Cooldown expiry failed, will retry: {e!r}")
+                await asyncio.sleep(1)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+cooldowns = CooldownService()
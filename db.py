@@ -0,0 +1,85 @@
+import functools
+from contextvars import ContextVar
+from sqlalchemy import Column, Integer, String, JSON, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session
+from dbconfig import DB_URL, DB_ECHO, apply_pragmas, log_settings
+
+# Engine
+
+# SQLite only has one writer at a time, so a small pool with some overflow covers bursts
+# without piling up connections that would just wait on the write lock.
+# check_same_thread is off because pooled connections get closed from whichever thread returns them.
+engine = create_async_engine(
+    DB_URL,
+    echo=DB_ECHO,
+    pool_size=5,
+    max_overflow=10,
+    pool_timeout=30,
+    connect_args={"check_same_thread": False},
+)
+event.listen(engine.sync_engine, "connect", apply_pragmas)
+
+# expire_on_commit is off so attributes stay readable after a commit, async sessions cannot lazily refresh them
+Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+# Every command invocation gets its own scope, so `session` resolves to a session owned by that command only.
+# Code running outside a command (startup, scripts) shares the default scope.
+_scope = ContextVar("db_scope", default=None)
+session = async_scoped_session(Session, scopefunc=_scope.get)
+
+Base = declarative_base()
+
+# DB Models
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    slack_id = Column(String, unique=True)
+    health = Column(Integer, default=100)
+    shield = Column(Integer, default=0)
+    rank = Column(String,default='Recruit')
+    # Satchels live in inventory_items now, this only holds ones that haven't been migrated yet
+    inventory = Column(JSON, nullable=True)
+    xp = Column(Integer, default=0, index=True)
+    kills = Column(Integer, default=0, index=True)
+    sieges = Column(Integer, default=0, index=True)
+    raids = Column(Integer, default=0, index=True)
+    fortifications = Column(Integer, default=0, index=True)
+    assassinations = Column(Integer, default=0, index=True)
+
+# Session handling
+
+def per_request(handler):
+    # Gives the handler a fresh session, commits what's left when it returns and rolls back if it raises
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        token = _scope.set(object())
+        try:
+            result = await handler(*args, **kwargs)
+            if session.registry.has():
+                await session.commit()
+            return result
+        except BaseException:
+            if session.registry.has():
+                await session.rollback()
+            raise
+        finally:
+            await session.remove()
+            _scope.reset(token)
+    return wrapper
+
+def _create_all(conn):
+    Base.metadata.create_all(conn)
+    # create_all skips tables that already exist, so indexes added to them later are created here
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+async def create_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_all)
+
+async def check_settings():
+    async with engine.connect() as conn:
+        return await conn.run_sync(log_settings)
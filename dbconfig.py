@@ -0,0 +1,61 @@
+import os
+
+# Database settings
+#
+# Everything here can be overridden from the environment.
+# The pragmas are applied to every new SQLite connection: WAL lets /leaderboard and the other readers run
+# while /attack writes, and synchronous=NORMAL only fsyncs at checkpoints instead of on every commit.
+
+DB_URL = os.environ.get("DB_URL", "sqlite+aiosqlite:///warlord.db")
+DB_ECHO = os.environ.get("DB_ECHO", "1") == "1"
+
+PRAGMAS = {
+    "journal_mode": os.environ.get("DB_JOURNAL_MODE", "wal"),
+    "synchronous": os.environ.get("DB_SYNCHRONOUS", "normal"),
+    # Bytes of the file mapped into memory, 0 turns it off
+    "mmap_size": os.environ.get("DB_MMAP_SIZE", str(64 * 1024 * 1024)),
+    # Negative is KiB rather than pages
+    "cache_size": os.environ.get("DB_CACHE_SIZE", str(-16 * 1024)),
+    # Milliseconds a connection waits on a locked database before failing
+    "busy_timeout": os.environ.get("DB_BUSY_TIMEOUT", "5000"),
+    "temp_store": os.environ.get("DB_TEMP_STORE", "memory"),
+}
+
+CHOICES = {
+    "journal_mode": ("delete", "truncate", "persist", "memory", "wal", "off"),
+    "synchronous": ("off", "normal", "full", "extra"),
+    "temp_store": ("default", "file", "memory"),
+}
+
+def _validate(pragmas):
+    for name, value in pragmas.items():
+        if name in CHOICES:
+            if value.lower() not in CHOICES[name]:
+                raise ValueError(f"DB setting {name}={value!r} must be one of {', '.join(CHOICES[name])}")
+        else:
+            try:
+                int(value)
+            except ValueError:
+                raise ValueError(f"DB setting {name}={value!r} must be a whole number") from None
+
+_validate(PRAGMAS)
+
+def apply_pragmas(dbapi_connection, connection_record=None):
+    # Connect event listener, runs before the pool hands the connection out
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+def effective_settings(connection):
+    # What SQLite actually ended up using, a memory database for example can't switch to WAL
+    return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in PRAGMAS}
+
+def log_settings(connection):
+    settings = effective_settings(connection)
+    print("SQLite settings: " + ", ".join(f"{name}={value}" for name, value in settings.items()))
+    if settings["journal_mode"].lower() != PRAGMAS["journal_mode"].lower():
+        print(f"SQLite kept journal_mode={settings['journal_mode']} instead of {PRAGMAS['journal_mode']}")
+    return settings
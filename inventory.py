@@ -0,0 +1,141 @@
+from sqlalchemy import Column, Integer, ForeignKey, select, update, delete, null
+from sqlalchemy.dialects.sqlite import insert
+from catalog import catalog
+from db import Base, Session, User
+
+# Inventory
+#
+# One row per (player, item) with its quantity, items are stored by their catalog id.
+# Picking up or using an item is a single-row UPSERT/UPDATE instead of rewriting the whole satchel,
+# and reading a satchel walks the primary key index for one player.
+
+STARTING_ITEMS = {"Rusty Sword": 1, "Small Health Potion": 3, "Rusty Armor": 1, "Family Picture": 1}
+
+# Players moved per transaction when migrating the old JSON column
+MIGRATE_BATCH = 500
+
+class InventoryItem(Base):
+    __tablename__ = 'inventory_items'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    qty = Column(Integer, nullable=False)
+
+class Inventory:
+
+    def __init__(self):
+        # Called with the user after every change to their items (the profile cache drops its snapshot)
+        self.listeners = []
+
+    async def load(self, user):
+        # Item name -> quantity, in catalog order
+        async with Session() as session:
+            rows = (await session.execute(
+                select(InventoryItem.item_id, InventoryItem.qty)
+                .where(InventoryItem.user_id == user.id)
+                .order_by(InventoryItem.item_id)
+            )).all()
+        return {catalog.items_by_id[item_id].name: qty for item_id, qty in rows if item_id in catalog.items_by_id}
+
+    async def has(self, user, item_name):
+        item_id = catalog.item_ids.get(item_name)
+        if item_id is None:
+            return False
+        async with Session() as session:
+            qty = await session.scalar(select(InventoryItem.qty).where(InventoryItem.user_id == user.id, InventoryItem.item_id == item_id))
+        return bool(qty)
+
+    async def empty(self, user):
+        async with Session() as session:
+            return await session.scalar(select(InventoryItem.user_id).where(InventoryItem.user_id == user.id, InventoryItem.qty > 0).limit(1)) is None
+
+    async def add(self, user, item_name, qty=1):
+        # Unique items are only added if the player doesn't have one yet, returns whether anything was added
+        item = catalog.items[item_name]
+        stmt = insert(InventoryItem).values(user_id=user.id, item_id=item.id, qty=1 if item.unique else qty)
+        if item.unique:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[InventoryItem.user_id, InventoryItem.item_id])
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[InventoryItem.user_id, InventoryItem.item_id],
+                set_={"qty": InventoryItem.qty + stmt.excluded.qty},
+            )
+        async with Session() as session, session.begin():
+            added = await session.scalar(stmt.returning(InventoryItem.qty))
+        if added is not None:
+            self.changed(user)
+        return added is not None
+
+    async def take(self, user, item_name, qty=1):
+        # Removes qty of an item if the player has that many, returns whether it did
+        item_id = catalog.item_ids.get(item_name)
+        if item_id is None:
+            return False
+        key = (InventoryItem.user_id == user.id, InventoryItem.item_id == item_id)
+        async with Session() as session, session.begin():
+            left = await session.scalar(
+                update(InventoryItem)
+                .where(*key, InventoryItem.qty >= qty)
+                .values(qty=InventoryItem.qty - qty)
+                .returning(InventoryItem.qty)
+            )
+            if left == 0:
+                await session.execute(delete(InventoryItem).where(*key))
+        if left is None:
+            return False
+        self.changed(user)
+        return True
+
+    async def give_starting(self, user_ids):
+        rows = [
+            {"user_id": user_id, "item_id": catalog.item_ids[name], "qty": qty}
+            for user_id in user_ids
+            for name, qty in STARTING_ITEMS.items()
+        ]
+        if not rows:
+            return
+        stmt = insert(InventoryItem).on_conflict_do_nothing(index_elements=[InventoryItem.user_id, InventoryItem.item_id])
+        async with Session() as session, session.begin():
+            await session.execute(stmt, rows)
+
+    def changed(self, user):
+        for listener in self.listeners:
+            listener(user)
+
+    async def migrate(self):
+        # Moves satchels out of the old users.inventory JSON column, each batch of players in one transaction.
+        # A migrated player's column is set to NULL, so running this again only picks up what's left.
+        moved = 0
+        while True:
+            async with Session() as session, session.begin():
+                players = (await session.execute(
+                    select(User.id, User.slack_id, User.inventory)
+                    .where(User.inventory.is_not(None))
+                    .limit(MIGRATE_BATCH)
+                )).all()
+                if not players:
+                    return moved
+
+                rows = []
+                for user_id, slack_id, items in players:
+                    for name, qty in (items or {}).items():
+                        item_id = catalog.item_ids.get(name)
+                        if item_id is None:
+                            print(f"Inventory migration: {slack_id} has {qty} x {name!r}, which isn't in the catalog, dropping it")
+                        elif qty > 0:
+                            rows.append({"user_id": user_id, "item_id": item_id, "qty": qty})
+
+                if rows:
+                    stmt = insert(InventoryItem)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[InventoryItem.user_id, InventoryItem.item_id],
+                        set_={"qty": InventoryItem.qty + stmt.excluded.qty},
+                    )
+                    await session.execute(stmt, rows)
+                await session.execute(
+                    update(User.__table__)
+                    .where(User.__table__.c.id.in_([user_id for user_id, _, _ in players]))
+                    .values(inventory=null())
+                )
+                moved += len(players)
+
+inventory = Inventory()
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from sqlalchemy import Column, Integer, String, Float, JSON, select, delete, func, update, bindparam, event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from dbconfig import DB_ECHO, apply_pragmas
+from db import Session, User, engine
+from progression import progression
+
+# Battle journal
+#
+# Every combat event is appended to battle_events: start, strike, counter, parry, hesitation, ambush, win,
+# loss, loot, flee and forfeit. Events are buffered and written in one multi-row INSERT every FLUSH_INTERVAL
+# seconds (or as soon as BATCH_SIZE are waiting), nothing is ever updated in place.
+# The journal is its own SQLite file, so those inserts never hold the game database's write lock.
+#
+# An event's data holds what it did to the player's stats ("xp" and "kills" as deltas), a win counts towards the
+# battle type's counter, so folding a player's events over their snapshot gives back their stats.
+# Compaction folds old events into journal_snapshots and deletes them.
+#
+#   python journal.py replay                 compare every player's stats with what the journal says
+#   python journal.py replay --apply         and write the journal's numbers back
+#   python journal.py compact --days 30      fold events older than 30 days into the snapshots
+
+JOURNAL_URL = os.environ.get("JOURNAL_URL", "sqlite+aiosqlite:///warlord-journal.db")
+
+FLUSH_INTERVAL = 2.0
+BATCH_SIZE = 500
+
+# Stats the journal can rebuild, and the counter each mission's win goes to
+REPLAYED = ("xp", "kills", "sieges", "raids", "fortifications", "assassinations")
+WINS = {"siege": "sieges", "raid": "raids", "fortify": "fortifications", "assassination": "assassinations"}
+
+journal_engine = create_async_engine(JOURNAL_URL, echo=DB_ECHO, connect_args={"check_same_thread": False})
+event.listen(journal_engine.sync_engine, "connect", apply_pragmas)
+JournalSession = async_sessionmaker(bind=journal_engine, expire_on_commit=False)
+
+JournalBase = declarative_base()
+
+class BattleEvent(JournalBase):
+    __tablename__ = 'battle_events'
+    id = Column(Integer, primary_key=True)
+    slack_id = Column(String, nullable=False, index=True)
+    at = Column(Float, nullable=False)
+    kind = Column(String, nullable=False)
+    battle_type = Column(String, nullable=True)
+    data = Column(JSON, nullable=True)
+
+class JournalSnapshot(JournalBase):
+    __tablename__ = 'journal_snapshots'
+    slack_id = Column(String, primary_key=True)
+    # Id of the last event folded in, replay picks up after it
+    upto = Column(Integer, nullable=False)
+    stats = Column(JSON, nullable=False)
+
+def fold(stats, kind, battle_type, data):
+    data = data or {}
+    stats["xp"] += data.get("xp", 0)
+    stats["kills"] += data.get("kills", 0)
+    if kind == "win" and battle_type in WINS:
+        stats[WINS[battle_type]] += 1
+    return stats
+
+def _empty():
+    return dict.fromkeys(REPLAYED, 0)
+
+class Journal:
+
+    def __init__(self, interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pending = []
+        self.lock = asyncio.Lock()
+        self.wake = asyncio.Event()
+        self.task = None
+
+    def record(self, slack_id, kind, battle_type=None, **data):
+        self.pending.append({"slack_id": slack_id, "at": time.time(), "kind": kind, "battle_type": battle_type, "data": data or None})
+        if len(self.pending) >= self.batch_size:
+            self.wake.set()
+
+    async def flush(self):
+        async with self.lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, []
+            try:
+                async with JournalSession() as session, session.begin():
+                    await session.execute(insert(BattleEvent), batch)
+            except BaseException:
+                # Keep them, in order, ahead of anything recorded meanwhile
+                self.pending[:0] = batch
+                raise
+            return len(batch)
+
+    async def create_tables(self):
+        async with journal_engine.begin() as conn:
+            await conn.run_sync(JournalBase.metadata.create_all)
+
+    async def seed(self):
+        # Players with neither a snapshot nor events got their stats before the journal existed (or have none yet),
+        # their current stats become their snapshot so replay starts from there
+        users = User.__table__
+        async with JournalSession() as session:
+            known = set((await session.scalars(select(JournalSnapshot.slack_id))).all())
+            known.update((await session.scalars(select(BattleEvent.slack_id).distinct())).all())
+        async with Session() as session:
+            rows = [
+                row for row in (await session.execute(select(users.c.slack_id, *(users.c[field] for field in REPLAYED)))).all()
+                if row[0] not in known
+            ]
+        if rows:
+            async with JournalSession() as session, session.begin():
+                await session.execute(insert(JournalSnapshot), [
+                    {"slack_id": slack_id, "upto": 0, "stats": {field: value or 0 for field, value in zip(REPLAYED, values)}}
+                    for slack_id, *values in rows
+                ])
+        return len(rows)
+
+    async def replay(self, slack_ids=None):
+        # slack_id -> stats (rank included) rebuilt from the snapshots and the events after them
+        async with JournalSession() as session:
+            snapshots = select(JournalSnapshot)
+            events = select(BattleEvent.id, BattleEvent.slack_id, BattleEvent.kind, BattleEvent.battle_type, BattleEvent.data).order_by(BattleEvent.id)
+            if slack_ids:
+                snapshots = snapshots.where(JournalSnapshot.slack_id.in_(slack_ids))
+                events = events.where(BattleEvent.slack_id.in_(slack_ids))
+            stats = {}
+            upto = {}
+            for snapshot in (await session.scalars(snapshots)).all():
+                stats[snapshot.slack_id] = {**_empty(), **snapshot.stats}
+                upto[snapshot.slack_id] = snapshot.upto
+            for event_id, slack_id, kind, battle_type, data in await session.execute(events):
+                if event_id > upto.get(slack_id, 0):
+                    fold(stats.setdefault(slack_id, _empty()), kind, battle_type, data)
+        for values in stats.values():
+            values["rank"] = progression.rank_for(values["xp"])
+        return stats
+
+    async def compact(self, before):
+        # Folds every event recorded before `before` into its player's snapshot, returns how many were folded
+        await self.flush()
+        async with JournalSession() as session, session.begin():
+            cutoff = await session.scalar(select(func.max(BattleEvent.id)).where(BattleEvent.at < before))
+            if cutoff is None:
+                return 0
+            events = (await session.execute(
+                select(BattleEvent.slack_id, BattleEvent.kind, BattleEvent.battle_type, BattleEvent.data)
+                .where(BattleEvent.id <= cutoff)
+                .order_by(BattleEvent.id)
+            )).all()
+            touched = {slack_id for slack_id, _, _, _ in events}
+            stats = {
+                snapshot.slack_id: {**_empty(), **snapshot.stats}
+                for snapshot in (await session.scalars(select(JournalSnapshot).where(JournalSnapshot.slack_id.in_(touched)))).all()
+            }
+            for slack_id, kind, battle_type, data in events:
+                fold(stats.setdefault(slack_id, _empty()), kind, battle_type, data)
+
+            stmt = insert(JournalSnapshot)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[JournalSnapshot.slack_id],
+                set_={"upto": stmt.excluded.upto, "stats": stmt.excluded.stats},
+            )
+            await session.execute(stmt, [{"slack_id": slack_id, "upto": cutoff, "stats": stats[slack_id]} for slack_id in touched])
+            await session.execute(delete(BattleEvent).where(BattleEvent.id <= cutoff))
+        return len(events)
+
+    async def run(self):
+        while True:
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Journal flush failed, will retry: {e!r}")
+                await asyncio.sleep(1)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        await journal_engine.dispose()
+
+journal = Journal()
+
+async def _replay(slack_ids, apply):
+    rebuilt = await journal.replay(slack_ids)
+    fields = REPLAYED + ("rank",)
+    users = User.__table__
+    async with Session() as session:
+        stored = {
+            slack_id: dict(zip(fields, values))
+            for slack_id, *values in await session.execute(
+                select(users.c.slack_id, *(users.c[field] for field in fields)).where(users.c.slack_id.in_(list(rebuilt)))
+            )
+        }
+
+    differ = {}
+    for slack_id, stats in sorted(rebuilt.items()):
+        current = stored.get(slack_id)
+        if current is None:
+            print(f"{slack_id}: in the journal but not in users")
+            continue
+        changes = {field: (current[field], stats[field]) for field in fields if current[field] != stats[field]}
+        if changes:
+            differ[slack_id] = stats
+            print(f"{slack_id}: " + ", ".join(f"{field} {old} -> {new}" for field, (old, new) in changes.items()))
+    print(f"{len(rebuilt)} players replayed, {len(differ)} differ from the users table")
+
+    if apply and differ:
+        stmt = (
+            update(users)
+            .where(users.c.slack_id == bindparam("b_slack_id"))
+            .values({field: bindparam(f"b_{field}") for field in fields})
+        )
+        async with Session() as session, session.begin():
+            await session.execute(stmt, [{"b_slack_id": slack_id, **{f"b_{f}": stats[f] for f in fields}} for slack_id, stats in differ.items()])
+        print(f"Wrote the journal's stats for {len(differ)} players")
+    return differ
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay or compact the battle journal. Run it while the bot is stopped.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="rebuild player stats from the journal")
+    replay.add_argument("--user", action="append", dest="users", help="only this slack id, can be repeated")
+    replay.add_argument("--apply", action="store_true", help="write the rebuilt stats to the users table")
+    compact = commands.add_parser("compact", help="fold old events into snapshots")
+    compact.add_argument("--days", type=float, default=30, help="keep events from the last this many days")
+    args = parser.parse_args()
+
+    asyncio.run(_run(args))
+    return 0
+
+async def _run(args):
+    try:
+        if args.command == "replay":
+            await _replay(args.users, args.apply)
+        else:
+            folded = await journal.compact(time.time() - args.days * 24 * 60 * 60)
+            print(f"Folded {folded} events into snapshots")
+    finally:
+        await journal_engine.dispose()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    sys.exit(main())
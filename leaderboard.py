@@ -0,0 +1,217 @@
+import bisect
+import time
+from sqlalchemy import select, func, or_, and_
+from db import Session, User
+from writebehind import stat_buffer
+
+# Leaderboards
+#
+# Each stat keeps its top CACHE_SIZE players in memory, ordered by (value, id) descending.
+# The stat buffer reports every staged change, so the cached lists stay current without re-querying;
+# pages that fall past the cached slice seek through the stat's index from the last cached row.
+# With a shared state backend other processes change stats this one never sees staged, so `shared` turns the
+# cached lists off and every page and position is read from the stat's index instead.
+
+PAGE_SIZE = 10
+CACHE_SIZE = 100
+
+# Below this many rows a list that has lost players off its tail is reloaded on the next read
+REFILL_AT = CACHE_SIZE // 2
+
+# How long the player count behind "#N of M" is reused before it's counted again
+PLAYER_COUNT_TTL = 60.0
+
+STATS = {
+    "xp": "XP",
+    "kills": "Kills",
+    "sieges": "Sieges",
+    "raids": "Raids",
+    "fortifications": "Fortifications",
+    "assassinations": "Assassinations",
+}
+
+STAT_ALIASES = {
+    "kill": "kills",
+    "siege": "sieges",
+    "raid": "raids",
+    "fortify": "fortifications",
+    "fortification": "fortifications",
+    "assassination": "assassinations",
+}
+
+class Entry:
+    __slots__ = ("key", "slack_id", "rank", "value")
+
+    def __init__(self, value, user_id, slack_id, rank):
+        # Negated so the list sorts ascending with bisect while reading highest first
+        self.key = (-value, -user_id)
+        self.slack_id = slack_id
+        self.rank = rank
+        self.value = value
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+class StatBoard:
+
+    def __init__(self, stat):
+        self.stat = stat
+        self.column = getattr(User, stat)
+        self.entries = []
+        self.positions = {}
+        self.loaded = False
+        # True when every player fits in the list, so missing players can always be added
+        self.exhaustive = False
+        self.loading = False
+        self.backlog = []
+
+    async def load(self):
+        self.loading = True
+        try:
+            # Changes staged before now aren't in the table yet and were never seen by this board, write them first.
+            # Anything staged from here on lands in the backlog and is applied over the loaded rows.
+            await stat_buffer.flush()
+            async with Session() as session:
+                rows = (await session.execute(
+                    select(User.id, User.slack_id, User.rank, self.column)
+                    .order_by(self.column.desc(), User.id.desc())
+                    .limit(CACHE_SIZE)
+                )).all()
+            self.entries = [Entry(value or 0, user_id, slack_id, rank) for user_id, slack_id, rank, value in rows]
+            self.positions = {entry.slack_id: entry for entry in self.entries}
+            self.exhaustive = len(rows) < CACHE_SIZE
+            self.loaded = True
+            backlog, self.backlog = self.backlog, []
+        finally:
+            self.loading = False
+        for args in backlog:
+            self.update(*args)
+
+    def update(self, user_id, slack_id, rank, value):
+        if self.loading:
+            self.backlog.append((user_id, slack_id, rank, value))
+            return
+        if not self.loaded:
+            return
+
+        entry = Entry(value, user_id, slack_id, rank)
+        old = self.positions.pop(slack_id, None)
+        if old is not None:
+            del self.entries[bisect.bisect_left(self.entries, old)]
+
+        # Someone only belongs in the list if they beat its last row, unless the list holds everyone
+        if self.exhaustive:
+            keep = True
+        elif self.entries:
+            keep = entry < self.entries[-1]
+        else:
+            keep = False
+
+        if keep:
+            bisect.insort(self.entries, entry)
+            self.positions[slack_id] = entry
+            if len(self.entries) > CACHE_SIZE:
+                dropped = self.entries.pop()
+                del self.positions[dropped.slack_id]
+                self.exhaustive = False
+        elif old is not None and len(self.entries) < REFILL_AT:
+            # Players we don't hold may now rank above them, so the list only stays trustworthy while it's long enough
+            self.loaded = False
+
+    async def page(self, page):
+        if not self.loaded:
+            await self.load()
+
+        start = (page - 1) * PAGE_SIZE
+        end = start + PAGE_SIZE
+        if end <= len(self.entries) or self.exhaustive:
+            return [(e.slack_id, e.rank, e.value) for e in self.entries[start:end]]
+
+        # Seek past the cached rows with the (stat, id) index instead of OFFSET-scanning from the top.
+        # Staged stats are written first so the table agrees with the cached rows.
+        await stat_buffer.flush()
+        query = select(User.slack_id, User.rank, self.column).order_by(self.column.desc(), User.id.desc())
+        skip = start
+        if self.entries:
+            last = self.entries[-1]
+            value, user_id = -last.key[0], -last.key[1]
+            query = query.where(or_(self.column < value, and_(self.column == value, User.id < user_id)))
+            skip = max(0, start - len(self.entries))
+        head = [(e.slack_id, e.rank, e.value) for e in self.entries[start:end]]
+        async with Session() as session:
+            rows = (await session.execute(query.limit(skip + end - start - len(head)))).all()
+        return head + [(slack_id, rank, value or 0) for slack_id, rank, value in rows[skip:]]
+
+    async def ahead_of(self, value):
+        # How many players have strictly more, so tied players share a position
+        if not self.loaded:
+            await self.load()
+
+        # Anyone above a value the cached list reaches is in the list itself
+        if self.exhaustive or (self.entries and value >= self.entries[-1].value):
+            return bisect.bisect_left(self.entries, (-value,), key=lambda e: e.key)
+        return await self.count_above(value)
+
+    async def count_above(self, value):
+        await stat_buffer.flush()
+        async with Session() as session:
+            return await session.scalar(select(func.count()).select_from(User).where(self.column > value))
+
+    async def read_page(self, page):
+        # Straight from the table, for when the cached list can't be trusted
+        await stat_buffer.flush()
+        query = (
+            select(User.slack_id, User.rank, self.column)
+            .order_by(self.column.desc(), User.id.desc())
+            .offset((page - 1) * PAGE_SIZE)
+            .limit(PAGE_SIZE)
+        )
+        async with Session() as session:
+            rows = (await session.execute(query)).all()
+        return [(slack_id, rank, value or 0) for slack_id, rank, value in rows]
+
+class Leaderboards:
+
+    def __init__(self):
+        self.boards = {stat: StatBoard(stat) for stat in STATS}
+        self.player_count = 0
+        self.counted_at = None
+        self.shared = False
+
+    def observe(self, user):
+        if self.shared:
+            return
+        for stat, board in self.boards.items():
+            board.update(user.id, user.slack_id, user.rank, getattr(user, stat) or 0)
+
+    async def page(self, stat, page):
+        if self.shared:
+            return await self.boards[stat].read_page(page)
+        return await self.boards[stat].page(page)
+
+    async def position(self, stat, user):
+        # Returns (position, players) for the user on one stat
+        board = self.boards[stat]
+        value = getattr(user, stat) or 0
+        ahead = await (board.count_above(value) if self.shared else board.ahead_of(value))
+        if board.exhaustive and user.slack_id not in board.positions:
+            # Players who haven't fought yet were never staged, count them in now
+            self.observe(user)
+        if board.exhaustive:
+            players = len(board.entries)
+        else:
+            now = time.monotonic()
+            if self.counted_at is None or now - self.counted_at > PLAYER_COUNT_TTL:
+                async with Session() as session:
+                    self.player_count = await session.scalar(select(func.count()).select_from(User))
+                self.counted_at = now
+            players = self.player_count
+        # The count can lag behind players who joined since it was taken
+        return ahead + 1, max(players, ahead + 1)
+
+def parse_stat(word):
+    word = word.lower()
+    word = STAT_ALIASES.get(word, word)
+    return word if word in STATS else None
+
+leaderboards = Leaderboards()
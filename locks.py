@@ -0,0 +1,61 @@
+import asyncio
+import functools
+import inspect
+
+# Per-player locks
+#
+# Handlers await the database and Slack halfway through changing a battle, so two /attack commands from the
+# same player could otherwise both read the same opponent hp and both move `current` on.
+# Every command holds its player's lock for its whole run: one player's commands take turns, different players
+# never wait on each other. A lock exists only while a command for that player is running or waiting.
+# With a shared state backend `backend` also takes the player's lock in Redis once the local one is held, so
+# commands for them on other processes take turns too.
+
+class UserLocks:
+
+    def __init__(self):
+        # slack_id -> [lock, commands holding or waiting for it]
+        self.locks = {}
+        self.backend = None
+
+    def __len__(self):
+        return len(self.locks)
+
+    def held(self):
+        return self.locks.keys()
+
+    def acquire(self, slack_id):
+        entry = self.locks.get(slack_id)
+        if entry is None:
+            entry = self.locks[slack_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry
+
+    def release(self, slack_id, entry):
+        entry[1] -= 1
+        if not entry[1]:
+            del self.locks[slack_id]
+
+    def serialized(self, handler):
+        # Runs on every command, so it finds `command` by position instead of binding the signature
+        command_at = list(inspect.signature(handler).parameters).index("command")
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            command = args[command_at] if len(args) > command_at else kwargs["command"]
+            slack_id = command["user_id"]
+            entry = self.acquire(slack_id)
+            try:
+                async with entry[0]:
+                    if self.backend is None:
+                        return await handler(*args, **kwargs)
+                    token = await self.backend.acquire(slack_id)
+                    try:
+                        return await handler(*args, **kwargs)
+                    finally:
+                        await self.backend.release(slack_id, token)
+            finally:
+                self.release(slack_id, entry)
+        return wrapper
+
+user_locks = UserLocks()
@@ -0,0 +1,75 @@
+import random
+from catalog import catalog
+
+# Loot tables
+#
+# Every (mission, tier) weight list from the catalog is compiled once into an alias table (Vose's method),
+# so a drop is one random number and two list reads no matter how many items the pool has.
+
+class AliasTable:
+    __slots__ = ("items", "prob", "alias", "size")
+
+    def __init__(self, weights):
+        items = [name for name, weight in weights if weight > 0]
+        total = sum(weight for _, weight in weights if weight > 0)
+        if not items:
+            raise ValueError("A loot table needs at least one item with a positive weight")
+
+        n = len(items)
+        scaled = [weight * n / total for _, weight in weights if weight > 0]
+        prob = [0.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Whatever is left over is 1.0 give or take float rounding
+        for i in small + large:
+            prob[i] = 1.0
+
+        self.items = tuple(items)
+        self.prob = tuple(prob)
+        self.alias = tuple(alias)
+        self.size = n
+
+    def sample(self, rng=random):
+        # One uniform draw picks the column with its integer part and flips the biased coin with the rest
+        u = rng.random() * self.size
+        i = int(u)
+        if u - i < self.prob[i]:
+            return self.items[i]
+        return self.items[self.alias[i]]
+
+    def sample_many(self, k, rng=random):
+        sample = self.sample
+        return [sample(rng) for _ in range(k)]
+
+class LootTables:
+
+    def __init__(self, catalog):
+        self.tables = {
+            mission: {tier: AliasTable(weights) for tier, weights in by_tier.items()}
+            for mission, by_tier in catalog.loot.items()
+        }
+        self.default = self.tables["default"]
+
+    def table(self, tier, mission=None):
+        return self.tables.get(mission, self.default).get(tier) or self.default[tier]
+
+    def roll(self, tier, mission=None, rng=random):
+        return self.table(tier, mission).sample(rng)
+
+    def roll_many(self, tier, k, mission=None, rng=random):
+        return self.table(tier, mission).sample_many(k, rng)
+
+loot = LootTables(catalog)
@@ -0,0 +1,163 @@
+import functools
+import os
+import time
+from contextvars import ContextVar
+from aiohttp import web
+from prometheus_client import CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from sqlalchemy import event
+
+# Metrics
+#
+# Every slash command is timed, and the SQL it runs and the replies it sends are counted and timed under its name.
+# Statements run by background tasks (stat flushes, cooldown expiry, the reaper) are counted under "background".
+# Battles, cooldowns and the outbound queue are read when Prometheus scrapes, straight from the live caches.
+#
+#   curl http://127.0.0.1:9464/metrics
+#
+# METRICS_PORT=0 turns the endpoint off.
+
+METRICS_ADDR = os.environ.get("METRICS_ADDR", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9464))
+
+# Most commands finish in a few milliseconds, the top buckets are for ones stuck behind a lock or reply pacing
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+BACKGROUND = "background"
+
+_command = ContextVar("metrics_command", default=BACKGROUND)
+
+registry = CollectorRegistry()
+
+command_seconds = Histogram("warlord_command_seconds", "Time spent handling a slash command", ["command"], buckets=BUCKETS, registry=registry)
+command_errors = Counter("warlord_command_errors", "Slash commands that raised", ["command"], registry=registry)
+sql_statements = Counter("warlord_sql_statements", "SQL statements executed", ["command"], registry=registry)
+sql_seconds = Counter("warlord_sql_seconds", "Time spent executing SQL statements", ["command"], registry=registry)
+responses = Counter("warlord_responses", "Replies sent through respond()", ["command"], registry=registry)
+respond_seconds = Counter("warlord_respond_seconds", "Time spent in respond()", ["command"], registry=registry)
+
+_children = {}
+
+def _child(metric, name):
+    # labels() validates and locks on every call, the per-command children are looked up once
+    child = _children.get((metric, name))
+    if child is None:
+        child = _children[(metric, name)] = metric.labels(name)
+    return child
+
+def instrument(name, handler):
+    # Times the handler and files everything it does under `name`
+    seconds = command_seconds.labels(name)
+    errors = command_errors.labels(name)
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        token = _command.set(name)
+        start = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - start)
+            _command.reset(token)
+    return wrapper
+
+def timed(route):
+    # Wraps a replies.buffered route so whatever the reply ends up sending through is counted and timed
+    def wrapper(respond, command):
+        target = route(respond, command)
+
+        async def send(*args, **kwargs):
+            name = _command.get()
+            start = time.perf_counter()
+            try:
+                return await target(*args, **kwargs)
+            finally:
+                _child(respond_seconds, name).inc(time.perf_counter() - start)
+                _child(responses, name).inc()
+        return send
+    return wrapper
+
+def watch_engine(engine):
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_execute)
+
+# The start time rides on the statement's execution context, so a statement that raises (and never reaches
+# after_cursor_execute) leaves nothing behind on the pooled connection
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    name = _command.get()
+    _child(sql_statements, name).inc()
+    _child(sql_seconds, name).inc(elapsed)
+
+class StateCollector:
+    # Sizes of the in-memory state, counted at scrape time
+
+    def __init__(self, battles, cooldowns, outbound):
+        self.battles = battles
+        self.cooldowns = cooldowns
+        self.outbound = outbound
+
+    def collect(self):
+        active = GaugeMetricFamily("warlord_active_battles", "Players in the middle of a battle", labels=["type"])
+        counts = {}
+        for battle in list(self.battles.cache.values()):
+            counts[battle.type] = counts.get(battle.type, 0) + 1
+        for battle_type, count in sorted(counts.items()):
+            active.add_metric([battle_type], count)
+        yield active
+
+        resting = GaugeMetricFamily("warlord_cooldowns", "Mission cooldowns still running", labels=["kind"])
+        counts = {}
+        for _, kind in list(self.cooldowns.cache):
+            counts[kind] = counts.get(kind, 0) + 1
+        for kind, count in sorted(counts.items()):
+            resting.add_metric([kind], count)
+        yield resting
+
+        yield GaugeMetricFamily("warlord_outbound_queued", "Messages waiting to be sent", value=sum(q.qsize() for q in self.outbound.queues))
+        yield GaugeMetricFamily("warlord_outbound_retrying", "Messages waiting for a retry", value=len(self.outbound.retries))
+        yield CounterMetricFamily("warlord_outbound_sent", "Messages Slack accepted", value=self.outbound.sent)
+        yield CounterMetricFamily("warlord_outbound_dropped", "Messages given up on", value=self.outbound.dropped)
+
+class MetricsServer:
+
+    def __init__(self, addr=METRICS_ADDR, port=METRICS_PORT):
+        self.addr = addr
+        self.port = port
+        self.runner = None
+
+    async def serve(self, request):
+        return web.Response(body=generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+    async def start(self):
+        if self.runner is not None or not self.port:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.serve)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.addr, self.port).start()
+        except OSError as e:
+            print(f"Metrics endpoint not started, {self.addr}:{self.port} is unavailable: {e}")
+            await runner.cleanup()
+            return
+        self.runner = runner
+        print(f"Metrics on http://{self.addr}:{self.port}/metrics")
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+metrics_server = MetricsServer()
@@ -0,0 +1,247 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from pathlib import Path
+from typing import NamedTuple
+import aiohttp
+
+# Outbound messages
+#
+# Replies and DMs are queued here and sent by a few worker tasks over one pooled, keep-alive HTTP session,
+# so a slow Slack never holds up a handler. Messages for the same destination always go to the same worker,
+# which keeps a reply and its paced follow-ups in order.
+#
+#   - a 429 pauses every worker for the Retry-After seconds and puts the message back in line
+#   - 5xx answers and network errors are retried with backoff, up to MAX_ATTEMPTS, from a bounded retry spool
+#   - whatever is still queued when the bot shuts down is written to SPOOL_PATH and sent on the next start
+#
+# Web API calls go to API_URL and response_url posts go wherever Slack said, so pointing OUTBOUND_API_URL at a
+# local server is all it takes to run this against a stand-in.
+
+API_URL = os.environ.get("OUTBOUND_API_URL", "https://slack.com/api/")
+SPOOL_PATH = Path(os.environ.get("OUTBOUND_SPOOL", "outbound_spool.jsonl"))
+
+WORKERS = int(os.environ.get("OUTBOUND_WORKERS", 4))
+CONNECTIONS = int(os.environ.get("OUTBOUND_CONNECTIONS", 8))
+
+# Messages waiting per worker, and messages waiting for a retry, before new ones are dropped
+QUEUE_LIMIT = 5000
+RETRY_LIMIT = 1000
+# Messages kept on disk at shutdown
+SPOOL_LIMIT = 1000
+
+MAX_ATTEMPTS = 5
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+TIMEOUT = 10.0
+
+# Seconds shutdown waits for the queues to empty before spooling the rest
+DRAIN_TIMEOUT = 5.0
+
+class Message(NamedTuple):
+    # kind is "api" (a Web API method, url is the method name) or "webhook" (a response_url)
+    kind: str
+    url: str
+    payload: dict
+    attempts: int = 0
+
+class Dispatcher:
+
+    def __init__(self, token=None, api_url=API_URL, spool_path=SPOOL_PATH, workers=WORKERS):
+        self.token = token
+        self.api_url = api_url
+        self.spool_path = Path(spool_path)
+        self.queues = [asyncio.Queue(QUEUE_LIMIT) for _ in range(workers)]
+        # (due, seq, message), seq keeps equal due times in the order they failed
+        self.retries = []
+        self.seq = itertools.count()
+        self.paused_until = 0.0
+        self.wake = asyncio.Event()
+        self.http = None
+        self.tasks = []
+        self.sent = 0
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return self.http is not None
+
+    def post_message(self, channel, text, **kwargs):
+        self.enqueue(Message("api", "chat.postMessage", {"channel": channel, "text": text, **kwargs}))
+
+    def responder(self, respond, command):
+        # The callable a handler replies through: queued when there's a response_url to post to,
+        # otherwise (tests, the benchmark) the respond it was given
+        response_url = command.get("response_url") if command else None
+        if not self.running or not response_url:
+            return respond
+
+        async def send(text="", **kwargs):
+            payload = {"text": text, **{key: value for key, value in kwargs.items() if value is not None}}
+            self.enqueue(Message("webhook", response_url, payload))
+        return send
+
+    def queue_for(self, message):
+        return self.queues[hash(self._destination(message)) % len(self.queues)]
+
+    def enqueue(self, message):
+        queue = self.queue_for(message)
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"Outbound queue is full, dropping a message to {self._target(message)}")
+
+    async def send(self, message):
+        # One attempt, returns None when it's done with the message or the seconds to wait before another
+        headers = {}
+        url = message.url
+        if message.kind == "api":
+            url = self.api_url + message.url
+            headers["Authorization"] = f"Bearer {self.token}"
+        async with self.http.post(url, json=message.payload, headers=headers) as resp:
+            if resp.status == 429:
+                retry_after = float(resp.headers.get("Retry-After", BACKOFF))
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                return retry_after
+            if resp.status >= 500:
+                return min(BACKOFF * 2 ** message.attempts, MAX_BACKOFF)
+            if resp.status >= 400:
+                print(f"Slack refused a message to {self._target(message)}: {resp.status} {await resp.text()}")
+                return None
+            if message.kind == "api":
+                body = await resp.json(content_type=None)
+                if not body.get("ok"):
+                    print(f"Slack refused a message to {self._target(message)}: {body.get('error')}")
+            self.sent += 1
+            return None
+
+    async def deliver(self, message):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            retry_in = await self.send(message)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Sending to {self._target(message)} failed: {e!r}")
+            retry_in = min(BACKOFF * 2 ** message.attempts, MAX_BACKOFF)
+        if retry_in is not None:
+            self.defer(message, retry_in)
+
+    def defer(self, message, delay):
+        message = message._replace(attempts=message.attempts + 1)
+        if message.attempts >= MAX_ATTEMPTS:
+            self.dropped += 1
+            print(f"Giving up on a message to {self._target(message)} after {message.attempts} attempts")
+            return
+        if len(self.retries) >= RETRY_LIMIT:
+            self.dropped += 1
+            print(f"Retry spool is full, dropping a message to {self._target(message)}")
+            return
+        due = time.monotonic() + delay
+        if not self.retries or due < self.retries[0][0]:
+            self.wake.set()
+        heapq.heappush(self.retries, (due, next(self.seq), message))
+
+    async def work(self, queue):
+        while True:
+            message = await queue.get()
+            try:
+                await self.deliver(message)
+            except asyncio.CancelledError:
+                # Shut down mid-send, it goes to the spool (and may reach Slack twice)
+                heapq.heappush(self.retries, (0.0, next(self.seq), message))
+                raise
+            except Exception as e:
+                print(f"Outbound worker error: {e!r}")
+            finally:
+                queue.task_done()
+
+    async def requeue(self):
+        # Puts retries back in line as they come due
+        while True:
+            self.wake.clear()
+            now = time.monotonic()
+            while self.retries and self.retries[0][0] <= now:
+                self.enqueue(heapq.heappop(self.retries)[2])
+            delay = self.retries[0][0] - now if self.retries else None
+            try:
+                await asyncio.wait_for(self.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def load_spool(self):
+        if not self.spool_path.exists():
+            return 0
+        count = 0
+        with self.spool_path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self.enqueue(Message(**json.loads(line)))
+                    count += 1
+        self.spool_path.unlink()
+        return count
+
+    def write_spool(self, messages):
+        if len(messages) > SPOOL_LIMIT:
+            print(f"Outbound spool keeps {SPOOL_LIMIT} of {len(messages)} pending messages")
+            messages = messages[:SPOOL_LIMIT]
+        with self.spool_path.open("a", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps(message._asdict()) + "\n")
+
+    def pending(self):
+        # Retries first, that includes anything cut off mid-send, which was ahead of its queue
+        messages = [message for _, _, message in sorted(self.retries)]
+        self.retries = []
+        for queue in self.queues:
+            while not queue.empty():
+                messages.append(queue.get_nowait())
+                queue.task_done()
+        return messages
+
+    def start(self):
+        if self.running:
+            return
+        connector = aiohttp.TCPConnector(limit=CONNECTIONS, keepalive_timeout=30)
+        self.http = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=TIMEOUT))
+        spooled = self.load_spool()
+        if spooled:
+            print(f"Sending {spooled} messages spooled at the last shutdown")
+        self.tasks = [asyncio.create_task(self.work(queue)) for queue in self.queues]
+        self.tasks.append(asyncio.create_task(self.requeue()))
+
+    async def close(self, timeout=DRAIN_TIMEOUT):
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        messages = self.pending()
+        if messages:
+            self.write_spool(messages)
+            print(f"Spooled {len(messages)} unsent messages to {self.spool_path}")
+        await self.http.close()
+        self.http = None
+
+    @staticmethod
+    def _destination(message):
+        # API calls all share a handful of method urls, the channel is what tells their destinations apart
+        if message.kind == "api":
+            return message.payload.get("channel", message.url)
+        return message.url
+
+    @staticmethod
+    def _target(message):
+        return message.payload.get("channel", "a response_url") if message.kind == "api" else "a response_url"
+
+outbound = Dispatcher()
@@ -0,0 +1,139 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+# Profiler
+#
+# Off unless PROFILE_RATE is set or an admin turns it on with /wl-profile. While on, that fraction of command
+# invocations run under cProfile with tracemalloc tracing what they allocate. Call stats and the memory still held
+# when the command returns are added up per command until they are dumped (/wl-profile dump, or SIGUSR1), which writes:
+#
+#   <command>.prof        cProfile stats, open with `python -m pstats` or snakeviz
+#   <command>.txt         the top functions by cumulative and by own time
+#   <command>-alloc.txt   the lines that allocated the most memory that was still held when the command returned
+#
+# cProfile sees the whole thread, so the other commands that ran while a sampled one was awaiting show up
+# in its stats too. Only one invocation is sampled at a time.
+
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+PROFILE_RATE = float(os.environ.get("PROFILE_RATE", 0))
+
+# Frames kept per allocation traceback, and allocation lines written per command
+TRACE_FRAMES = 5
+TOP_ALLOCATIONS = 40
+TOP_FUNCTIONS = 40
+
+class Profiler:
+
+    def __init__(self, rate=0.0, directory=PROFILE_DIR):
+        self.rate = 0.0
+        self.directory = Path(directory)
+        self.stats = {}
+        # command -> {traceback: [bytes, blocks]}
+        self.allocations = {}
+        self.samples = {}
+        self.busy = False
+        # Whether tracemalloc was started here, one started with PYTHONTRACEMALLOC is left running
+        self.tracing = False
+        self.set_rate(rate)
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def set_rate(self, rate):
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Profile rate {rate} must be between 0 and 1")
+        self.rate = rate
+        if rate > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self.tracing = True
+        elif rate == 0 and self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def wrap(self, name, handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            if self.busy or not self.enabled or random.random() >= self.rate:
+                return await handler(*args, **kwargs)
+            return await self.sample(name, handler, args, kwargs)
+        return wrapper
+
+    async def sample(self, name, handler, args, kwargs):
+        self.busy = True
+        # Only what's allocated from here on is traced, so the snapshot afterwards is just this command's
+        # (and whatever ran beside it) rather than a diff against everything the process holds
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.clear_traces()
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            profile.disable()
+            # Turning profiling off mid-command stops tracemalloc, that sample just has no allocations
+            snapshot = tracemalloc.take_snapshot() if tracing and tracemalloc.is_tracing() else None
+            self.busy = False
+            self.samples[name] = self.samples.get(name, 0) + 1
+            if name in self.stats:
+                self.stats[name].add(profile)
+            else:
+                self.stats[name] = pstats.Stats(profile)
+            if snapshot is not None:
+                self.add_allocations(name, snapshot)
+
+    def add_allocations(self, name, snapshot):
+        totals = self.allocations.setdefault(name, {})
+        for stat in snapshot.statistics("traceback"):
+            entry = totals.setdefault(stat.traceback, [0, 0])
+            entry[0] += stat.size
+            entry[1] += stat.count
+
+    def dump(self):
+        # Writes everything gathered so far and starts over, returns the files written
+        if not self.stats:
+            return []
+        folder = self.directory / time.strftime("%Y%m%d-%H%M%S")
+        folder.mkdir(parents=True, exist_ok=True)
+        written = []
+        for name, stats in sorted(self.stats.items()):
+            path = folder / f"{name}.prof"
+            stats.dump_stats(path)
+            written.append(path)
+
+            out = io.StringIO()
+            out.write(f"{name}: {self.samples[name]} sampled invocations\n\n")
+            report = pstats.Stats(str(path), stream=out)
+            report.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            report.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+            path = folder / f"{name}.txt"
+            path.write_text(out.getvalue())
+            written.append(path)
+
+            if self.allocations.get(name):
+                path = folder / f"{name}-alloc.txt"
+                path.write_text(self.allocation_report(name))
+                written.append(path)
+
+        self.stats, self.allocations, self.samples = {}, {}, {}
+        return written
+
+    def allocation_report(self, name):
+        samples = self.samples[name]
+        top = sorted(self.allocations[name].items(), key=lambda item: -item[1][0])[:TOP_ALLOCATIONS]
+        lines = [f"{name}: memory still held when the command returned, over {samples} sampled invocations", ""]
+        for traceback, (size, count) in top:
+            lines.append(f"{size / 1024:.1f} KiB in {count} blocks, {size / samples:.0f} B per invocation")
+            lines.extend(f"    {line}" for line in traceback.format(most_recent_first=True))
+            lines.append("")
+        return "\n".join(lines)
+
+profiler = Profiler(PROFILE_RATE)
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import NamedTuple
+from sqlalchemy import select, event
+from db import Session, User
+from writebehind import stat_buffer
+from inventory import inventory
+
+# Profile cache
+#
+# /rank, /satchel, /stats and the *-count commands only print a few columns of a player.
+# They read a compact, read-only snapshot from an LRU of the last CACHE_SIZE players looked up.
+# Staging a player refreshes their snapshot in place; any other write to their row or their items drops it.
+# With a shared state backend other processes write players too, so `shared` turns the LRU off and every
+# lookup reads the row.
+
+CACHE_SIZE = 1024
+
+class Profile(NamedTuple):
+    id: int
+    slack_id: str
+    rank: str
+    health: int
+    shield: int
+    xp: int
+    kills: int
+    sieges: int
+    raids: int
+    fortifications: int
+    assassinations: int
+    inventory: MappingProxyType
+
+    @classmethod
+    def of(cls, user, items, overlay=None):
+        values = {field: getattr(user, field) for field in cls._fields if field != "inventory"}
+        if overlay:
+            values.update({field: value for field, value in overlay.items() if field in values})
+        return cls(**values, inventory=MappingProxyType(dict(items)))
+
+COLUMNS = [getattr(User, field) for field in Profile._fields if field != "inventory"]
+
+class ProfileCache:
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared = False
+
+    async def get(self, slack_id):
+        profile = None if self.shared else self.cache.get(slack_id)
+        if profile is not None:
+            self.cache.move_to_end(slack_id)
+            self.hits += 1
+            return profile
+
+        self.misses += 1
+        async with Session() as session:
+            row = (await session.execute(select(*COLUMNS).filter_by(slack_id=slack_id))).first()
+        if row is None:
+            return None
+        items = await inventory.load(row)
+        if self.shared:
+            return Profile.of(row, items, stat_buffer.staged(slack_id))
+        return self.put(row, items, stat_buffer.staged(slack_id))
+
+    def put(self, user, items, overlay=None):
+        profile = Profile.of(user, items, overlay)
+        self.cache[profile.slack_id] = profile
+        self.cache.move_to_end(profile.slack_id)
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+        return profile
+
+    def observe(self, user):
+        # Called for every staged user, only players already cached are refreshed
+        cached = self.cache.get(user.slack_id)
+        if cached is not None:
+            self.cache[user.slack_id] = Profile.of(user, cached.inventory)
+
+    def forget(self, user):
+        self.invalidate(user.slack_id)
+
+    def invalidate(self, slack_id):
+        self.cache.pop(slack_id, None)
+
+profiles = ProfileCache()
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_delete")
+def _row_written(mapper, connection, user):
+    profiles.invalidate(user.slack_id)
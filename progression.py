@@ -0,0 +1,40 @@
+import bisect
+from typing import NamedTuple
+from catalog import catalog
+
+# Progression
+#
+# Ranks are earned at the XP thresholds in content.json. The rank for an XP total is one bisect over the
+# sorted thresholds, and advance() only touches the user (and only reports back) when the rank actually changes.
+
+class RankChange(NamedTuple):
+    old: str
+    new: str
+    promoted: bool
+
+class Progression:
+
+    def __init__(self, ranks):
+        self.ranks = ranks
+        self.thresholds = [r.xp for r in ranks]
+        self.order = {r.name: i for i, r in enumerate(ranks)}
+        self.tiers = {r.name: r.tier for r in ranks}
+
+    def rank_for(self, xp):
+        return self.ranks[max(0, bisect.bisect_right(self.thresholds, xp) - 1)].name
+
+    def tier(self, rank):
+        return self.tiers.get(rank, self.ranks[0].tier)
+
+    def top(self, rank):
+        return rank == self.ranks[-1].name
+
+    def advance(self, user):
+        new = self.rank_for(user.xp or 0)
+        old = user.rank
+        if new == old:
+            return None
+        user.rank = new
+        return RankChange(old, new, self.order[new] > self.order.get(old, -1))
+
+progression = Progression(catalog.ranks)
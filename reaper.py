@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy.dialects.sqlite import insert
+from db import Base, Session
+from battles import battles
+from writebehind import stat_buffer
+
+# Battle reaper
+#
+# A player who starts a battle and walks away would keep it (and its row) forever.
+# Every REAP_INTERVAL seconds the reaper closes battles idle for longer than BATTLE_TTL as a forfeit:
+# the battle is dropped the same way /exit drops it, the player's staged stats are written out, the forfeit is
+# recorded in the forfeits table and `on_forfeit` is told.
+
+BATTLE_TTL = float(os.environ.get("BATTLE_TTL", 6 * 60 * 60))
+REAP_INTERVAL = float(os.environ.get("REAP_INTERVAL", 5 * 60))
+
+class Forfeit(Base):
+    __tablename__ = 'forfeits'
+    id = Column(Integer, primary_key=True)
+    slack_id = Column(String, nullable=False, index=True)
+    battle_type = Column(String, nullable=False)
+    at = Column(Float, nullable=False)
+
+class BattleReaper:
+
+    def __init__(self, store=battles, ttl=BATTLE_TTL, interval=REAP_INTERVAL):
+        self.store = store
+        self.ttl = ttl
+        self.interval = interval
+        self.on_forfeit = None
+        # Returns the players with a command running, their battles are left for the next sweep
+        self.busy = None
+        self.task = None
+
+    async def sweep(self, now=None):
+        now = now if now is not None else time.time()
+        keep = set(self.busy()) if self.busy is not None else set()
+        reaped = await self.store.reap(self.ttl, now, keep)
+        if not reaped:
+            return 0, 0
+
+        flushed = await stat_buffer.flush(*reaped)
+        async with Session() as session, session.begin():
+            await session.execute(insert(Forfeit), [
+                {"slack_id": slack_id, "battle_type": battle.type, "at": now} for slack_id, battle in reaped.items()
+            ])
+        if self.on_forfeit is not None:
+            for slack_id, battle in reaped.items():
+                try:
+                    await self.on_forfeit(slack_id, battle)
+                except Exception as e:
+                    print(f"Forfeit notice for {slack_id} failed: {e!r}")
+
+        print(f"Reaper: forfeited {len(reaped)} idle battles, wrote {flushed} staged stat rows, {len(self.store)} battles still active")
+        return len(reaped), flushed
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"Battle sweep failed, will retry: {e!r}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+reaper = BattleReaper()
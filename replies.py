@@ -0,0 +1,109 @@
+import asyncio
+import functools
+import inspect
+from contextvars import ContextVar
+
+# Replies
+#
+# Handlers call `respond` as often as the story needs, but every call used to be its own POST to Slack's response_url.
+# A Reply collects those parts and sends them as one Block Kit message when the handler returns.
+# pause() is the only thing that sends early: when reply pacing is on, what's been said so far goes out first,
+# then the rest follows after the delay.
+
+# Slack rejects a section over 3000 characters and a message over 50 blocks
+SECTION_LIMIT = 3000
+BLOCK_LIMIT = 50
+
+_current = ContextVar("reply", default=None)
+
+class Reply:
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.parts = []
+        self.sent = 0
+
+    async def __call__(self, text="", **kwargs):
+        # Takes the same arguments as Bolt's respond, anything beyond plain text goes out on its own
+        if kwargs:
+            await self.flush()
+            await self.respond(text=text, **kwargs)
+            self.sent += 1
+            return
+        if text:
+            self.parts.append(text)
+
+    async def flush(self):
+        if not self.parts:
+            return
+        parts, self.parts = self.parts, []
+        blocks = [
+            {"type": "section", "text": {"type": "mrkdwn", "text": chunk}}
+            for part in parts
+            for chunk in _chunks(part)
+        ]
+        for start in range(0, len(blocks), BLOCK_LIMIT):
+            batch = blocks[start:start + BLOCK_LIMIT]
+            # The plain text is what notifications and clients without blocks show
+            text = "\n\n".join(block["text"]["text"] for block in batch)
+            await self.respond(text=text, blocks=batch)
+            self.sent += 1
+
+def _chunks(text):
+    return [text[i:i + SECTION_LIMIT] for i in range(0, len(text), SECTION_LIMIT)] or [text]
+
+def buffered(handler, route=None):
+    # Swaps the handler's `respond` for a Reply and sends it once the handler is done.
+    # route(respond, command) may hand back something else for the Reply to send through.
+    # Looked up once here rather than binding the signature on every call
+    names = list(inspect.signature(handler).parameters)
+    respond_at = names.index("respond")
+    command_at = names.index("command") if "command" in names else None
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        positional = len(args) > respond_at
+        respond = args[respond_at] if positional else kwargs["respond"]
+        if route is not None:
+            command = args[command_at] if command_at is not None and len(args) > command_at else kwargs.get("command")
+            respond = route(respond, command)
+        reply = Reply(respond)
+        if positional:
+            args = args[:respond_at] + (reply,) + args[respond_at + 1:]
+        else:
+            kwargs["respond"] = reply
+        token = _current.set(reply)
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            await reply.flush()
+    return wrapper
+
+async def _acked():
+    pass
+
+def acked(handler):
+    # Acks the command straight away and hands the handler an ack that does nothing, so a command queued behind
+    # the player's earlier ones still answers within Slack's 3 seconds
+    ack_at = list(inspect.signature(handler).parameters).index("ack")
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        if len(args) > ack_at:
+            await args[ack_at]()
+            args = args[:ack_at] + (_acked,) + args[ack_at + 1:]
+        else:
+            await kwargs["ack"]()
+            kwargs["ack"] = _acked
+        return await handler(*args, **kwargs)
+    return wrapper
+
+async def pause(seconds):
+    # With pacing on, sends what the current reply has so far and waits before the handler carries on
+    if seconds <= 0:
+        return
+    reply = _current.get()
+    if reply is not None:
+        await reply.flush()
+    await asyncio.sleep(seconds)
@@ -0,0 +1,218 @@
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from catalog import catalog
+
+# Combat simulator
+#
+# Plays whole battles headlessly, many thousands at a time as NumPy arrays, to see how a weapon fares against a
+# mission at a rank tier. Opponents, weapons and loot weights come from the same catalog the bot loads.
+# The rules below mirror /attack and the mission starts in bot.py, keep them in step when those change:
+#
+#   - a swing sooner than MIN_TIME or later than MAX_TIME after the last one is wasted and the opponent strikes
+#   - otherwise the weapon hits shield first, then health; an opponent that survives strikes back the same way
+#   - only a death to that strike back costs XP, dying to a parry or a hesitation costs none
+#   - after the last opponent falls, high tiers may be ambushed; beating the ambusher ends the mission with loot
+#
+# The player's time between swings is drawn uniformly from [min_gap, max_gap] seconds.
+
+MIN_TIME = 3
+MAX_TIME = 15
+
+PARTY_SIZES = {
+    "siege": (3, 5),
+    "raid": (1, 3),
+    "fortify": (5, 7),
+    "assassination": (1, 1),
+}
+
+# XP for a plain win, for a win that went through an ambush (per mission), and lost on a counter-strike death.
+# A player with DEATH_XP_FLOOR XP or less loses all of it instead.
+WIN_XP = 10
+AMBUSH_WIN_XP = {"siege": 20, "raid": 10, "fortify": 25, "assassination": 5}
+DEATH_XP = 5
+DEATH_XP_FLOOR = 20
+
+AMBUSH_TIERS = ("high", "very high")
+AMBUSH_CHANCE = 0.1
+OTHER_AMBUSH_CHANCE = 0.00001
+
+# Battles still going after this many swings count as abandoned
+MAX_SWINGS = 500
+
+FIGHTING, WON, LOST, ABANDONED = 0, 1, 2, 3
+
+def _roster(battle_type, names):
+    table = catalog.opponents[battle_type]
+    return (
+        np.array([table[name].health for name in names], dtype=np.int64),
+        np.array([table[name].shield for name in names], dtype=np.int64),
+        np.array([table[name].damage for name in names], dtype=np.int64),
+    )
+
+def fight(opp_hp, opp_shield, opp_damage, sizes, hp, shield, damage, min_gap, max_gap, rng, timed_first):
+    # Fights every battle in the batch at once; the opponent arrays are (battles, party) and changed in place.
+    # `countered` marks the lost battles where the killing blow was a counter-strike rather than a parry or hesitation.
+    n = len(hp)
+    current = np.zeros(n, dtype=np.int64)
+    swings = np.zeros(n, dtype=np.int64)
+    seconds = np.zeros(n)
+    state = np.full(n, FIGHTING, dtype=np.int8)
+    countered = np.zeros(n, dtype=bool)
+    # The opening swing of a fresh battle has nothing to be early or late against
+    timed = np.full(n, timed_first)
+
+    for _ in range(MAX_SWINGS):
+        live = np.flatnonzero(state == FIGHTING)
+        if live.size == 0:
+            break
+
+        gap = rng.uniform(min_gap, max_gap, live.size)
+        seconds[live] += gap
+        swings[live] += 1
+        mistimed = timed[live] & ((gap < MIN_TIME) | (gap > MAX_TIME))
+        timed[live] = True
+
+        hit = live[~mistimed]
+        target = current[hit]
+        absorbed = np.minimum(damage, opp_shield[hit, target])
+        opp_shield[hit, target] -= absorbed
+        opp_hp[hit, target] -= damage - absorbed
+
+        killed = opp_hp[hit, target] <= 0
+        fallen = hit[killed]
+        current[fallen] += 1
+        state[fallen[current[fallen] >= sizes[fallen]]] = WON
+
+        strike_back = hit[~killed]
+        struck = np.concatenate([live[mistimed], strike_back])
+        incoming = opp_damage[struck, current[struck]]
+        blocked = np.minimum(incoming, shield[struck])
+        shield[struck] -= blocked
+        hp[struck] -= incoming - blocked
+        state[struck[hp[struck] <= 0]] = LOST
+        countered[strike_back[hp[strike_back] <= 0]] = True
+
+    state[state == FIGHTING] = ABANDONED
+    return state, swings, seconds, countered
+
+def simulate(battle_type, tier, weapon, battles=100_000, min_gap=4.0, max_gap=12.0, start_shield=0, start_xp=100, seed=None):
+    rng = np.random.default_rng(seed)
+    pool = catalog.tier_opponents(battle_type, tier)
+    if not pool:
+        return None
+
+    # Party sizes and a random draw without replacement from the tier's pool, one row per battle
+    low, high = PARTY_SIZES[battle_type]
+    sizes = np.minimum(rng.integers(low, high + 1, battles), len(pool))
+    width = min(high, len(pool))
+    picks = np.argsort(rng.random((battles, len(pool))), axis=1)[:, :width]
+    pool_hp, pool_shield, pool_damage = _roster(battle_type, pool)
+
+    hp = np.full(battles, 100, dtype=np.int64)
+    shield = np.full(battles, start_shield, dtype=np.int64)
+    damage = catalog.weapons[weapon].damage
+    state, swings, seconds, countered = fight(
+        pool_hp[picks], pool_shield[picks], pool_damage[picks], sizes,
+        hp, shield, damage, min_gap, max_gap, rng, timed_first=False,
+    )
+
+    # Winners may be ambushed on the way back, the ambusher is fought with whatever health and shield is left
+    chance = AMBUSH_CHANCE if tier in AMBUSH_TIERS else OTHER_AMBUSH_CHANCE
+    ambushers = catalog.tier_opponents("ambush", "high") + catalog.tier_opponents("ambush", "very high")
+    ambushed = np.flatnonzero((state == WON) & (rng.random(battles) < chance))
+    ambush_state = np.full(battles, -1, dtype=np.int8)
+    if ambushed.size and ambushers:
+        a_hp, a_shield, a_damage = _roster("ambush", ambushers)
+        pick = rng.integers(0, len(ambushers), ambushed.size)
+        result, extra_swings, extra_seconds, extra_countered = fight(
+            a_hp[pick][:, None], a_shield[pick][:, None], a_damage[pick][:, None], np.ones(ambushed.size, dtype=np.int64),
+            hp[ambushed], shield[ambushed], damage, min_gap, max_gap, rng, timed_first=True,
+        )
+        ambush_state[ambushed] = result
+        state[ambushed] = result
+        countered[ambushed] = extra_countered
+        swings[ambushed] += extra_swings
+        seconds[ambushed] += extra_seconds
+
+    looted = int(np.count_nonzero(ambush_state == WON))
+    xp = (
+        WIN_XP * np.count_nonzero((state == WON) & (ambush_state != WON))
+        + AMBUSH_WIN_XP[battle_type] * looted
+        - (DEATH_XP if start_xp > DEATH_XP_FLOOR else start_xp) * np.count_nonzero(countered)
+    )
+
+    loot = {}
+    if looted:
+        weights = catalog.loot.get(battle_type, catalog.loot["default"]).get(tier) or catalog.loot["default"][tier]
+        names = [name for name, _ in weights]
+        probabilities = np.array([weight for _, weight in weights], dtype=float)
+        counts = np.bincount(rng.choice(len(names), size=looted, p=probabilities / probabilities.sum()), minlength=len(names))
+        loot = {name: round(int(count) / looted, 4) for name, count in zip(names, counts) if count}
+
+    hours = seconds.sum() / 3600
+    won = state == WON
+    return {
+        "mission": battle_type,
+        "tier": tier,
+        "weapon": weapon,
+        "battles": battles,
+        "win_rate": round(float(won.mean()), 4),
+        "death_rate": round(float((state == LOST).mean()), 4),
+        "abandoned_rate": round(float((state == ABANDONED).mean()), 4),
+        "ambush_rate": round(ambushed.size / battles, 4),
+        "swings": round(float(swings.mean()), 2),
+        "swings_to_win": round(float(swings[won].mean()), 2) if won.any() else None,
+        "xp_per_battle": round(xp / battles, 3),
+        "xp_per_hour": round(xp / hours, 1) if hours else 0.0,
+        "loot": loot,
+    }
+
+def _run(task):
+    return simulate(*task)
+
+def sweep(missions, tiers, weapons, battles, min_gap, max_gap, start_shield=0, start_xp=100, seed=None, workers=1):
+    # One task per (mission, tier, weapon), each with its own independent random stream
+    combos = [(m, t, w) for m in missions for t in tiers for w in weapons]
+    seeds = np.random.SeedSequence(seed).spawn(len(combos))
+    tasks = [(m, t, w, battles, min_gap, max_gap, start_shield, start_xp, s) for (m, t, w), s in zip(combos, seeds)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run, tasks))
+    else:
+        results = [_run(task) for task in tasks]
+    return [result for result in results if result is not None]
+
+def print_results(results):
+    print(f"{'mission':<14}{'tier':<11}{'weapon':<24}{'win':>7}{'death':>7}{'swings':>8}{'xp/battle':>11}{'xp/hour':>9}  top loot")
+    for r in results:
+        top = ", ".join(f"{name} {share:.0%}" for name, share in sorted(r["loot"].items(), key=lambda kv: -kv[1])[:3])
+        print(f"{r['mission']:<14}{r['tier']:<11}{r['weapon']:<24}{r['win_rate']:>7.1%}{r['death_rate']:>7.1%}"
+              f"{r['swings']:>8}{r['xp_per_battle']:>11}{r['xp_per_hour']:>9}  {top}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate battles from the game catalog.")
+    parser.add_argument("--missions", nargs="+", default=list(PARTY_SIZES), choices=list(PARTY_SIZES))
+    parser.add_argument("--tiers", nargs="+", default=list(catalog.tiers), choices=list(catalog.tiers))
+    parser.add_argument("--weapons", nargs="+", default=list(catalog.weapons), choices=list(catalog.weapons))
+    parser.add_argument("--battles", type=int, default=100_000, help="battles per mission, tier and weapon")
+    parser.add_argument("--min-gap", type=float, default=4.0, help="fewest seconds between the player's swings")
+    parser.add_argument("--max-gap", type=float, default=12.0, help="most seconds between the player's swings")
+    parser.add_argument("--shield", type=int, default=0, help="shield the player starts each battle with")
+    parser.add_argument("--xp", type=int, default=100, help="XP the player has going into each battle, at 20 or less a death costs all of it")
+    parser.add_argument("--workers", type=int, default=1, help="processes to spread the sweep over")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = sweep(args.missions, args.tiers, args.weapons, args.battles, args.min_gap, args.max_gap, args.shield, args.xp, args.seed, args.workers)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import secrets
+import redis.asyncio
+from battles import battles, to_values, from_values
+from cooldowns import cooldowns, DURATIONS
+from writebehind import stat_buffer
+from profiles import profiles
+from leaderboard import leaderboards
+from locks import user_locks
+
+# Shared state
+#
+# By default battles and cooldowns live in this process (backed by SQLite), so only one bot process can run.
+# With STATE_BACKEND=redis they live in Redis instead and every command first syncs the player's battle and
+# cooldowns from there, so any process can serve any player. Keys, under REDIS_PREFIX:
+#
+#   battle:<slack id>               hash of the battle's fields, last_attack included
+#   battles                         sorted set of slack ids by when their battle last changed, for the reaper
+#   cooldown:<slack id>:<kind>      ready_at, expiring when the cooldown does
+#   cooldowns                       sorted set of "<slack id>:<kind>:<ready_at>" by ready_at, for the ready DMs
+#   lock:<slack id>                 token of the process running the player's command, expiring after LOCK_TTL
+#
+# Writes that touch more than one key go out as one MULTI/EXEC pipeline. A process only announces a cooldown
+# if it wins the ZREM of its member, and only settles an abandoned battle if it wins the ZREM from `battles`.
+# Stats still go to the shared database, flushed after each command so the next process reads them. Since no
+# process sees the others' stats staged, the leaderboards and the profile cache are switched to reading that table.
+
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "sqlite")
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.environ.get("REDIS_PREFIX", "warlord:")
+
+# Milliseconds a player's lock outlives a process that died holding it, longer than any command with reply pacing
+LOCK_TTL = int(os.environ.get("REDIS_LOCK_TTL", 30_000))
+# Seconds between tries while another process holds the lock
+LOCK_POLL = 0.02
+
+# Deletes the lock only if it still holds our token, so a lock that expired and was taken over is left alone
+RELEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+class RedisBattles:
+    shared = True
+
+    def __init__(self, client, prefix=REDIS_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self.index = prefix + "battles"
+
+    def key(self, slack_id):
+        return f"{self.prefix}battle:{slack_id}"
+
+    async def load(self):
+        slack_ids = [_text(slack_id) for slack_id in await self.client.zrange(self.index, 0, -1)]
+        async with self.client.pipeline(transaction=False) as pipe:
+            for slack_id in slack_ids:
+                pipe.hgetall(self.key(slack_id))
+            rows = await pipe.execute()
+        return {slack_id: _decode(row) for slack_id, row in zip(slack_ids, rows) if row}
+
+    async def fetch(self, slack_id):
+        row = await self.client.hgetall(self.key(slack_id))
+        return _decode(row) if row else None
+
+    async def save(self, slack_id, battle):
+        key = self.key(slack_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            # Fields that are None now (an ambush that's over) mustn't survive from the last save
+            pipe.delete(key)
+            pipe.hset(key, mapping=_encode(slack_id, battle))
+            pipe.zadd(self.index, {slack_id: battle.updated_at})
+            await pipe.execute()
+
+    async def delete(self, slack_id):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key(slack_id))
+            pipe.zrem(self.index, slack_id)
+            await pipe.execute()
+
+    async def reap(self, cache, ttl, now, keep=()):
+        slack_ids = [_text(slack_id) for slack_id in await self.client.zrangebyscore(self.index, "-inf", now - ttl)]
+        slack_ids = [slack_id for slack_id in slack_ids if slack_id not in keep]
+        if not slack_ids:
+            return {}
+        async with self.client.pipeline(transaction=False) as pipe:
+            for slack_id in slack_ids:
+                pipe.zrem(self.index, slack_id)
+                pipe.hgetall(self.key(slack_id))
+            results = await pipe.execute()
+
+        reaped = {}
+        for slack_id, won, row in zip(slack_ids, results[::2], results[1::2]):
+            if won and row:
+                reaped[slack_id] = _decode(row)
+        if reaped:
+            await self.client.delete(*(self.key(slack_id) for slack_id in reaped))
+        return reaped
+
+def _encode(slack_id, battle):
+    values = to_values(slack_id, battle)
+    del values["slack_id"]
+    values["opponents"] = json.dumps(values["opponents"])
+    if values["resume"] is not None:
+        values["resume"] = json.dumps(values["resume"])
+    return {field: value for field, value in values.items() if value is not None}
+
+def _decode(row):
+    values = {_text(field): _text(value) for field, value in row.items()}
+    values["opponents"] = json.loads(values["opponents"])
+    values["current"] = int(values.get("current", 0))
+    for field in ("last_attack", "updated_at"):
+        if field in values:
+            values[field] = float(values[field])
+    if "resume" in values:
+        values["resume"] = json.loads(values["resume"])
+    return from_values(values)
+
+class RedisCooldowns:
+    shared = True
+
+    def __init__(self, client, prefix=REDIS_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self.index = prefix + "cooldowns"
+
+    def key(self, slack_id, kind):
+        return f"{self.prefix}cooldown:{slack_id}:{kind}"
+
+    async def load(self, now):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zrangebyscore(self.index, f"({now}", "+inf")
+            # Cooldowns that ran out while no process was watching are just dropped
+            pipe.zremrangebyscore(self.index, "-inf", now)
+            members, _ = await pipe.execute()
+        cache = {}
+        for member in members:
+            slack_id, kind, ready_at = _text(member).split(":")
+            cache[(slack_id, kind)] = float(ready_at)
+        return cache
+
+    async def fetch(self, slack_id):
+        kinds = list(DURATIONS)
+        values = await self.client.mget([self.key(slack_id, kind) for kind in kinds])
+        return {kind: float(value) for kind, value in zip(kinds, values) if value is not None}
+
+    async def save(self, slack_id, kind, ready_at):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self.key(slack_id, kind), repr(ready_at), pxat=int(ready_at * 1000))
+            pipe.zadd(self.index, {f"{slack_id}:{kind}:{ready_at!r}": ready_at})
+            await pipe.execute()
+
+    async def claim(self, due):
+        # The member carries ready_at, so a cooldown is announced once however many processes had it
+        async with self.client.pipeline(transaction=False) as pipe:
+            for slack_id, kind, ready_at in due:
+                pipe.zrem(self.index, f"{slack_id}:{kind}:{ready_at!r}")
+            won = await pipe.execute()
+        return [entry for entry, claimed in zip(due, won) if claimed]
+
+class RedisLocks:
+    # One player's commands take turns across processes, UserLocks already makes them take turns within one
+
+    def __init__(self, client, prefix=REDIS_PREFIX, ttl=LOCK_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.release_script = client.register_script(RELEASE)
+
+    def key(self, slack_id):
+        return f"{self.prefix}lock:{slack_id}"
+
+    async def acquire(self, slack_id):
+        key = self.key(slack_id)
+        token = secrets.token_hex(16)
+        while not await self.client.set(key, token, nx=True, px=self.ttl):
+            await asyncio.sleep(LOCK_POLL)
+        return token
+
+    async def release(self, slack_id, token):
+        await self.release_script(keys=[self.key(slack_id)], args=[token])
+
+class SharedState:
+
+    def __init__(self):
+        self.client = None
+
+    @property
+    def shared(self):
+        return battles.backend.shared
+
+    def configure(self, backend=STATE_BACKEND, client=None):
+        # client lets tests hand in a fake or an already connected redis.asyncio client
+        if backend == "sqlite":
+            return
+        if backend != "redis":
+            raise ValueError(f"STATE_BACKEND={backend!r} must be sqlite or redis")
+        if client is None:
+            client = redis.asyncio.from_url(REDIS_URL, decode_responses=True)
+        self.client = client
+        battles.backend = RedisBattles(client)
+        cooldowns.backend = RedisCooldowns(client)
+        leaderboards.shared = True
+        profiles.shared = True
+        user_locks.backend = RedisLocks(client)
+
+    def synced(self, handler):
+        # Brings the player's battle and cooldowns up to date before the handler and their stats to the
+        # database after it, when another process may be serving them too
+        command_at = list(inspect.signature(handler).parameters).index("command")
+
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            if not self.shared:
+                return await handler(*args, **kwargs)
+            command = args[command_at] if len(args) > command_at else kwargs["command"]
+            slack_id = command["user_id"]
+            profiles.invalidate(slack_id)
+            await battles.sync(slack_id)
+            await cooldowns.sync(slack_id)
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                await stat_buffer.flush(slack_id)
+        return wrapper
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+state = SharedState()
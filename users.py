@@ -0,0 +1,69 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from db import Session, User, session
+from writebehind import stat_buffer
+from inventory import inventory
+
+# Users
+#
+# Every command needs the player's row and creates it the first time they show up.
+# Creation is one INSERT ... ON CONFLICT DO NOTHING RETURNING, so two commands racing for the
+# same new player both end up with the row instead of one of them hitting the slack_id unique constraint.
+
+class Users:
+
+    def __init__(self):
+        # Called with each newly created user (the leaderboards count them in)
+        self.listeners = []
+
+    async def get(self, slack_id):
+        # The player's row in the command's session, with any staged stats on top
+        user = await session.scalar(select(User).filter_by(slack_id=slack_id))
+        if user is None:
+            user = await session.scalar(_insert([slack_id]).returning(User))
+            # Committed straight away so the write lock isn't held while the command runs
+            await session.commit()
+            if user is None:
+                # Somebody else created it between our select and insert
+                user = await session.scalar(select(User).filter_by(slack_id=slack_id))
+            else:
+                await self.created([user])
+        return stat_buffer.load(user)
+
+    async def get_many(self, slack_ids):
+        # Same as get() for a batch, one select and at most one insert
+        slack_ids = list(dict.fromkeys(slack_ids))
+        found = {user.slack_id: user for user in await session.scalars(select(User).where(User.slack_id.in_(slack_ids)))}
+        missing = [slack_id for slack_id in slack_ids if slack_id not in found]
+        if missing:
+            created = (await session.scalars(_insert(missing).returning(User))).all()
+            await session.commit()
+            found.update({user.slack_id: user for user in created})
+            await self.created(created)
+            late = [slack_id for slack_id in missing if slack_id not in found]
+            if late:
+                for user in await session.scalars(select(User).where(User.slack_id.in_(late))):
+                    found[user.slack_id] = user
+        return {slack_id: stat_buffer.load(found[slack_id]) for slack_id in slack_ids}
+
+    async def ensure_many(self, slack_ids):
+        # For admin jobs that only need the rows to exist, returns how many were created
+        slack_ids = list(dict.fromkeys(slack_ids))
+        if not slack_ids:
+            return 0
+        async with Session() as db_session, db_session.begin():
+            created = (await db_session.scalars(_insert(slack_ids).returning(User))).all()
+        await self.created(created)
+        return len(created)
+
+    async def created(self, new_users):
+        await inventory.give_starting([user.id for user in new_users])
+        for user in new_users:
+            for listener in self.listeners:
+                listener(user)
+
+def _insert(slack_ids):
+    # Column defaults (health, rank, ...) are filled in per row like a normal insert
+    return insert(User).values([{"slack_id": slack_id} for slack_id in slack_ids]).on_conflict_do_nothing(index_elements=[User.slack_id])
+
+users = Users()
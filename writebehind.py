@@ -0,0 +1,105 @@
+import asyncio
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm.attributes import set_committed_value
+from db import Session, User
+
+# Write-behind buffer for combat stats
+#
+# A battle changes the same User row on almost every /attack. Instead of committing each change,
+# handlers stage the row's stat columns here and the buffer writes them out in one transaction,
+# either at a battle boundary (start, win, loss, exit) or every FLUSH_INTERVAL seconds.
+
+FLUSH_INTERVAL = 5.0
+
+TRACKED = ("health", "shield", "rank", "xp", "kills", "sieges", "raids", "fortifications", "assassinations")
+
+class StatBuffer:
+
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self.pending = {}
+        self.inflight = {}
+        self.lock = asyncio.Lock()
+        self.task = None
+        # Called with the user after every stage, for caches that follow stats (the leaderboards)
+        self.listeners = []
+
+    def staged(self, slack_id):
+        # The newest values not yet in the table, or None
+        return self.pending.get(slack_id) or self.inflight.get(slack_id)
+
+    def load(self, user):
+        # Puts the staged values back onto a freshly queried row so reads never see stale stats
+        if user is None:
+            return user
+        values = self.staged(user.slack_id)
+        if values:
+            for field, value in values.items():
+                set_committed_value(user, field, value)
+        return user
+
+    def stage(self, user):
+        # Takes the row's stat columns into the buffer and clears them from the session, so the
+        # request's own commit doesn't write them as well
+        values = {field: getattr(user, field) for field in TRACKED}
+        self.pending[user.slack_id] = values
+        for field, value in values.items():
+            set_committed_value(user, field, value)
+        for listener in self.listeners:
+            listener(user)
+
+    async def flush(self, *slack_ids):
+        async with self.lock:
+            if slack_ids:
+                batch = {sid: self.pending.pop(sid) for sid in slack_ids if sid in self.pending}
+            else:
+                batch, self.pending = self.pending, {}
+
+            if not batch:
+                return 0
+
+            self.inflight.update(batch)
+            rows = [{"b_slack_id": sid, **{f"b_{field}": value for field, value in values.items()}} for sid, values in batch.items()]
+            stmt = (
+                update(User.__table__)
+                .where(User.__table__.c.slack_id == bindparam("b_slack_id"))
+                .values({field: bindparam(f"b_{field}") for field in TRACKED})
+            )
+
+            try:
+                async with Session() as session, session.begin():
+                    await session.execute(stmt, rows)
+            except BaseException:
+                # Anything staged again while we were writing is newer, keep that one
+                for sid, values in batch.items():
+                    self.pending.setdefault(sid, values)
+                raise
+            finally:
+                for sid in batch:
+                    self.inflight.pop(sid, None)
+
+            return len(rows)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Stat flush failed, will retry: {e!r}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+stat_buffer = StatBuffer()